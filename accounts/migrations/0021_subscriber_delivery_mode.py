@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_alter_user_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='delivery_mode',
+            field=models.CharField(choices=[('IMMEDIATE', 'Every new story'), ('DAILY', 'Daily digest'), ('WEEKLY', 'Weekly digest')], default='IMMEDIATE', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_subscriber_delivery_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='receive_notices',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='receive_vacancies',
+            field=models.BooleanField(default=True),
+        ),
+    ]
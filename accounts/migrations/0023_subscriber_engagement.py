@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_subscriber_content_preferences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriber',
+            name='engagement_score',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='last_engaged_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscriber',
+            name='reengagement_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -89,6 +89,12 @@ class TeamMember(models.Model):
 
 
 class Subscriber(models.Model):
+    DELIVERY_MODES = [
+        ('IMMEDIATE', 'Every new story'),
+        ('DAILY', 'Daily digest'),
+        ('WEEKLY', 'Weekly digest'),
+    ]
+    
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=100)
     # token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
@@ -97,6 +103,13 @@ class Subscriber(models.Model):
     subscribed_at = models.DateTimeField(auto_now_add=True)
     verified_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    delivery_mode = models.CharField(max_length=10, choices=DELIVERY_MODES, default='IMMEDIATE')
+    receive_vacancies = models.BooleanField(default=True)
+    receive_notices = models.BooleanField(default=True)
+    # Rolled up from email opens and clicks by the rollup_engagement command
+    last_engaged_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    engagement_score = models.PositiveIntegerField(default=0)
+    reengagement_sent_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-subscribed_at']
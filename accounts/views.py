@@ -9,11 +9,10 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
 
 from .forms import CustomAuthenticationForm, CustomPasswordChangeForm, UserProfileForm, TeamMemberProfileForm
 from .models import User, TeamMember, PasswordResetCode
+from publisher.utils.outbox_utils import queue_mail
 
 
 # ---------------------------------------------------------
@@ -373,21 +372,11 @@ def send_reset_code(request):
     request.session['reset_user_id'] = user.id
     request.session['reset_verified'] = False
 
-    try:
-        send_mail(
-            'Password Reset Code',
-            f'Your password reset code is: {code}',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False
-        )
-    except Exception:
-        # DEV fallback
-        return JsonResponse({
-            'success': True,
-            'message': 'Email not configured.',
-            'code': code
-        })
+    queue_mail(
+        'Password Reset Code',
+        f'Your password reset code is: {code}',
+        [user.email],
+    )
 
     return JsonResponse({'success': True, 'message': 'Code sent successfully.'})
 
@@ -1,3 +1,68 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models import F
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from publisher.models import Story
+from publisher.utils.outbox_utils import publish_due_stories
+
+
+class StoryCountersTests(TestCase):
+    """Editing or unpublishing a story never writes back stale delivery counters"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='secret')
+        self.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=self.author, status='PUBLISHED',
+        )
+        self.client.force_login(self.author)
+
+    def post_with_stale_row(self, name, data=None):
+        # The view loads the row, then the worker records deliveries before it saves
+        stale = Story.objects.get(id=self.story.id)
+        Story.objects.filter(id=self.story.id).update(sent_count=F('sent_count') + 5, notify_cursor=42)
+        with mock.patch('management.views.get_object_or_404', return_value=stale):
+            self.client.post(reverse(name, args=[self.story.id]), data or {})
+        self.story.refresh_from_db()
+
+    def test_edit(self):
+        self.post_with_stale_row('story_edit', {
+            'headline': 'Edited', 'snippet': 'Snippet', 'content': '<p>Body</p>', 'read_time': '3 min',
+        })
+        self.assertEqual((self.story.headline, self.story.sent_count, self.story.notify_cursor), ('Edited', 5, 42))
+
+    def test_unpublish(self):
+        self.post_with_stale_row('story_unpublish')
+        self.assertEqual((self.story.status, self.story.sent_count), ('DRAFT', 5))
+
+
+class PublishScheduledTests(TestCase):
+    """A scheduled story can be published straight away, and the list page offers it"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='secret')
+        self.story = Story.objects.create(
+            headline='Scheduled story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=self.author, status='SCHEDULED', publish_at=timezone.now() + timedelta(days=1),
+        )
+        self.client.force_login(self.author)
+
+    def test_publish_now(self):
+        response = self.client.post(reverse('story_publish', args=[self.story.id]))
+        self.assertEqual(response.json()['icon'], 'success')
+        self.story.refresh_from_db()
+        self.assertEqual((self.story.status, self.story.publish_at, self.story.notify_cursor), ('PUBLISHED', None, 0))
+        # The scheduler finds nothing left to publish
+        self.assertEqual(publish_due_stories(timezone.now() + timedelta(days=2)), [])
 
-# Create your tests here.
+    def test_list_page(self):
+        response = self.client.get(reverse('story_list'), {'status': 'SCHEDULED'})
+        self.assertContains(response, 'title="Publish now"')
+        self.assertContains(response, 'title="Cancel schedule"')
+        self.assertNotContains(response, 'title="Unpublish"')
+        self.assertContains(response, '<option value="SCHEDULED" selected>')
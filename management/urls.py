@@ -9,6 +9,8 @@ urlpatterns = [
     path('stories/<int:pk>/', views.story_detail, name='story_detail'),
     path('stories/<int:pk>/edit/', views.story_edit, name='story_edit'),
     path('stories/<int:pk>/publish/', views.story_publish, name='story_publish'),
+    path('stories/<int:pk>/email-preview/', views.story_email_preview, name='story_email_preview'),
+    path('stories/<int:pk>/schedule/', views.story_schedule, name='story_schedule'),
     path('stories/<int:pk>/unpublish/', views.story_unpublish, name='story_unpublish'),
     path('stories/<int:pk>/delete/', views.story_delete, name='story_delete'),
     
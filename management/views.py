@@ -1,10 +1,11 @@
 # views.py - COMPLETE FILE (FUNCTION-BASED VIEWS ONLY)
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
+from django.conf import settings
 from django.contrib import messages
 from django.urls import reverse_lazy, reverse
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.contenttypes.models import ContentType
 import json
 from django.db.models import Count
@@ -12,12 +13,16 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 from django.utils.html import strip_tags
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import datetime
 
 from django.db.models import Q
 from publisher.models import Story, Vacancy, Notice, Category, GenericAttachment
 from publisher.forms import StoryForm, VacancyForm, NoticeForm, CategoryForm
 from publisher.utils.attachment_utils import attach_multiple_files_to_object
+from publisher.utils.cache_utils import bump_generation
+from publisher.utils.outbox_utils import stop_story_notifications
+from publisher.utils.story_email_utils import invalidate_story_email, story_email
 from publisher.views import notify_subscribers
 
 from accounts.models import User
@@ -685,16 +690,24 @@ def notice_edit(request, pk):
 
 @login_required
 def story_publish(request, pk):
-    """Publish a story and notify subscribers"""
+    """Publish a draft, or a scheduled story ahead of its time, and notify subscribers"""
     try:
         story = get_object_or_404(Story, id=pk, author=request.user)
         
-        if story.status == 'DRAFT':
-            story.status = 'PUBLISHED'
-            story.published_at = timezone.now()
-            story.save()
+        # Conditional update: of two concurrent clicks (or a click and the
+        # publish_scheduled command) only one flips the status, so only one
+        # of them starts the fan-out
+        published = Story.objects.filter(id=story.id, status__in=['DRAFT', 'SCHEDULED']).update(
+            status='PUBLISHED',
+            published_at=timezone.now(),
+            publish_at=None,
+        )
+        
+        if published:
+            # update() sends no post_save, so retire the cached list pages here
+            bump_generation(Story)
             
-            # Notify subscribers in background thread
+            # Queue notifications for the send_outbox worker
             notify_subscribers(story.id)
             
             return JsonResponse({
@@ -708,7 +721,7 @@ def story_publish(request, pk):
                 'icon': 'info',
                 'title': 'Already Published',
                 'message': 'This story is already published',
-                'status': story.status
+                'status': 'PUBLISHED'
             })
             
     except Http404:
@@ -728,6 +741,72 @@ def story_publish(request, pk):
 
 
 
+@login_required
+@require_POST
+def story_schedule(request, pk):
+    """Schedule a draft story to publish (and notify subscribers) later"""
+    try:
+        story = get_object_or_404(Story, id=pk, author=request.user)
+
+        # An ISO 8601 instant with its offset (the browser sends UTC); a naive
+        # value would be read in the server's TIME_ZONE, not the editor's
+        publish_at = parse_datetime(request.POST.get('publish_at', ''))
+        if publish_at is None:
+            return JsonResponse({
+                'icon': 'error',
+                'title': 'Invalid Date',
+                'message': 'Please choose a valid publish date and time'
+            }, status=400)
+        if timezone.is_naive(publish_at):
+            return JsonResponse({
+                'icon': 'error',
+                'title': 'Invalid Date',
+                'message': 'The publish time must include its timezone'
+            }, status=400)
+        if publish_at <= timezone.now():
+            return JsonResponse({
+                'icon': 'error',
+                'title': 'Invalid Date',
+                'message': 'The publish time must be in the future'
+            }, status=400)
+
+        # Conditional update, as in story_publish: a story that was published
+        # in the meantime is never pushed back to SCHEDULED
+        scheduled = Story.objects.filter(id=story.id, status__in=['DRAFT', 'SCHEDULED']).update(
+            status='SCHEDULED',
+            publish_at=publish_at,
+        )
+
+        if scheduled:
+            return JsonResponse({
+                'icon': 'success',
+                'title': 'Scheduled!',
+                'message': 'The story will be published, and subscribers notified, at the time you chose.',
+                'status': 'SCHEDULED'
+            })
+        else:
+            return JsonResponse({
+                'icon': 'info',
+                'title': 'Already Published',
+                'message': 'This story is already published',
+                'status': 'PUBLISHED'
+            })
+
+    except Http404:
+        return JsonResponse({
+            'icon': 'error',
+            'title': 'Not Found',
+            'message': 'Story not found or you do not have permission'
+        }, status=404)
+    except Exception as e:
+        print(f"Error in story_schedule: {str(e)}")
+        return JsonResponse({
+            'icon': 'error',
+            'title': 'Server Error',
+            'message': 'An error occurred. Please try again.'
+        }, status=500)
+
+
 @login_required
 @require_POST
 def story_unpublish(request, pk):
@@ -738,7 +817,7 @@ def story_unpublish(request, pk):
         if story.status == 'PUBLISHED':
             story.status = 'DRAFT'
             story.published_at = None
-            story.save()
+            story.save(update_fields=['status', 'published_at'])
             
             return JsonResponse({
                 'icon': 'success',
@@ -1138,7 +1217,11 @@ def story_edit(request, pk):
             elif remove_thumbnail:
                 story.thumbnail = None
             
-            story.save()
+            # Only the edited fields: the send_outbox worker updates the
+            # delivery counters and notify_cursor on this row concurrently
+            story.save(update_fields=['headline', 'snippet', 'content', 'read_time', 'category', 'thumbnail'])
+            # The notification email shows these fields: render it afresh
+            invalidate_story_email(story.id)
             
             return JsonResponse({
                 'icon': 'success',
@@ -1166,6 +1249,18 @@ def story_edit(request, pk):
         return render(request, 'management/story/edit_story.html', context)
 
 
+@login_required
+def story_email_preview(request, pk):
+    """The story's notification email as subscribers will see it, from the rendered email cache"""
+    story = get_object_or_404(Story.objects.select_related('author', 'category'), id=pk, author=request.user)
+    _, _, html_message = story_email(story)
+    return HttpResponse(html_message.render({
+        'subscriber_name': request.user.get_full_name() or 'Reader',
+        'unsubscribe_url': '#',
+        'preferences_url': '#',
+        # Links go straight to the story and the preview records no open
+        'click_url': f"{settings.SITE_URL}/publisher/story_page/",
+    }))
 
 
 @login_required
@@ -1181,9 +1276,12 @@ def story_unpublish(request, pk):
             messages.error(request, 'You do not have permission to unpublish this story.')
             return redirect('story_detail', pk=story.pk)
         
-        # Unpublish the story
+        # Unpublish the story (or cancel its schedule)
         story.status = 'DRAFT'
-        story.save()
+        story.publish_at = None
+        story.save(update_fields=['status', 'publish_at'])
+        # Subscribers not emailed yet are not emailed about a draft
+        stop_story_notifications(story.id)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
@@ -1300,7 +1398,7 @@ def story_list(request):
     active_filters = {k: v for k, v in filters.items() if v and k != 'search'}
     
     # Apply filters
-    if filters['status'] in ['DRAFT', 'PUBLISHED']:
+    if filters['status'] in ['DRAFT', 'SCHEDULED', 'PUBLISHED']:
         queryset = queryset.filter(status=filters['status'])
     
     if filters['author']:
@@ -2319,7 +2417,7 @@ def dashboard(request):
         new_subscribers = "+0"
     
     # User-specific content
-    user_stories = Story.objects.filter(author=request.user).order_by('-created_at')[:5]
+    user_stories = Story.objects.filter(author=request.user).select_related('category').order_by('-created_at')[:5]
     recent_vacancies = Vacancy.objects.filter(is_active=True).order_by('-created_at')[:5]
     recent_notices = Notice.objects.filter(is_active=True).order_by('-created_at')[:5]
     categories = Category.objects.all()[:10]
@@ -119,6 +119,76 @@ USE_TZ = True
 
 SITE_URL = 'http://localhost:8000'
 
+# Story notification outbox (drained by `manage.py send_outbox`)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = 60  # seconds, doubled after every failed attempt
+EMAIL_DELIVERY_FLUSH_EVERY = 200  # buffered delivery results written per bulk update
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 900  # seconds before a claimed batch is considered abandoned
+EMAIL_MESSAGES_PER_CONNECTION = int(os.environ.get('EMAIL_MESSAGES_PER_CONNECTION', 100))  # reconnect after this many
+EMAIL_SENDER_CONCURRENCY = int(os.environ.get('EMAIL_SENDER_CONCURRENCY', 4))  # parallel SMTP sessions
+EMAIL_MAX_SEND_RATE = float(os.environ.get('EMAIL_MAX_SEND_RATE', 0))  # messages/second across all sessions, 0 = no cap
+EMAIL_PREENCODED_FANOUT = True  # encode each story email to MIME once and stamp per-recipient headers
+EMAIL_SENDER_ENGINE = os.environ.get('EMAIL_SENDER_ENGINE', 'asyncio')  # 'asyncio' or 'threads'; non-SMTP backends always use threads
+EMAIL_ASYNC_CONCURRENCY = int(os.environ.get('EMAIL_ASYNC_CONCURRENCY', 20))  # SMTP sessions (= messages in flight) on the event loop
+EMAIL_ASYNC_QUEUE_SIZE = 100  # dispatched messages waiting for a session before the dispatcher blocks
+
+# Per destination domain send rates (messages/second) and backoff after a 4xx deferral
+EMAIL_DOMAIN_RATE_LIMITS = {
+    'gmail.com': 5,
+    'yahoo.com': 2,
+    'outlook.com': 2,
+    'hotmail.com': 2,
+}
+EMAIL_DOMAIN_DEFAULT_RATE = 0  # domains not listed above are only bound by EMAIL_MAX_SEND_RATE
+EMAIL_DOMAIN_BACKOFF = 60  # seconds, doubled on every further deferral
+EMAIL_DOMAIN_MAX_BACKOFF = 3600
+EMAIL_RELAY_BACKOFF = 60  # seconds all sending pauses after a failed SMTP session (e.g. AUTH), doubled on every further failure
+EMAIL_RELAY_MAX_BACKOFF = 3600
+
+# Off-peak send window for large fan-outs: after the first EMAIL_SEND_WINDOW_BURST
+# recipients, notifications are paced at EMAIL_SEND_WINDOW_RATE per hour between these
+# local hours (may wrap midnight), e.g. (22, 6). None sends everything straight away.
+EMAIL_SEND_WINDOW = None
+EMAIL_SEND_WINDOW_RATE = 2000
+EMAIL_SEND_WINDOW_BURST = 500
+
+# Engagement tracking: opens (pixel) and clicks (redirect) are buffered in each web
+# process and written every EMAIL_TRACKING_FLUSH_EVERY hits or FLUSH_INTERVAL seconds
+EMAIL_TRACKING = True
+EMAIL_TRACKING_FLUSH_EVERY = 200
+EMAIL_TRACKING_FLUSH_INTERVAL = 60
+# Subscribers who opened or clicked anything (or subscribed) this recently are "engaged"
+EMAIL_ENGAGED_DAYS = 365
+EMAIL_ENGAGEMENT_SCORE_DAYS = 90
+# 'all', or 'engaged' to skip dormant subscribers in story and digest fan-outs
+EMAIL_FANOUT_AUDIENCE = 'all'
+# Re-engagement emails per send_reengagement run, and how long to wait for an answer
+# before rollup_engagement --prune deactivates the subscriber
+EMAIL_REENGAGEMENT_BATCH = 500
+EMAIL_REENGAGEMENT_GRACE_DAYS = 30
+
+# Addresses that bounce are suppressed (see publisher.SuppressedEmail)
+EMAIL_SUPPRESS_AFTER_FAILURES = 3  # failed deliveries in a row before an address is suppressed
+
+# Largest page_size the public list APIs (stories, vacancies, notices) will serve
+API_MAX_PAGE_SIZE = 50
+
+# Responses of the public list APIs are cached per query string and invalidated by
+# generation counters that publisher.signals bumps on every save/delete. The file
+# cache is shared by all the web processes on the host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'api',
+    },
+}
+API_CACHE_ALIAS = 'api'
+API_CACHE_TIMEOUT = 600  # seconds; also bounds date-based filters such as open vacancies
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
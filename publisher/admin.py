@@ -6,4 +6,24 @@ admin.site.register(Story)
 admin.site.register(GenericAttachment)
 admin.site.register(Category)
 admin.site.register(Vacancy)
-admin.site.register(Notice)
\ No newline at end of file
+admin.site.register(Notice)
+admin.site.register(Digest)
+admin.site.register(StoryDelivery)
+admin.site.register(TransactionalEmail)
+admin.site.register(ReengagementEmail)
+admin.site.register(SubscriberCategory)
+
+
+
+@admin.register(SuppressedEmail)
+class SuppressedEmailAdmin(admin.ModelAdmin):
+    list_display = ['email', 'is_suppressed', 'reason', 'failure_count', 'smtp_code', 'updated_at']
+    list_filter = ['is_suppressed', 'reason']
+    search_fields = ['email']
+    readonly_fields = ['created_at', 'updated_at']
+    actions = ['clear']
+
+    @admin.action(description="Clear selected addresses (mail them again)")
+    def clear(self, request, queryset):
+        count = queryset.delete()[0]
+        self.message_user(request, f"{count} address(es) cleared from the suppression list.")
@@ -0,0 +1,128 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from accounts.models import Subscriber, User
+from publisher.models import Story, StoryDelivery
+from publisher.utils.email_utils import get_sender_pool
+from publisher.utils.outbox_utils import DeliveryRecorder, process_outbox
+from publisher.utils.smtp_sink import SMTPSink
+from publisher.views import notify_subscribers
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish a story to N synthetic subscribers end to end against an "
+        "in-process SMTP sink and report throughput. Runs in a throwaway "
+        "test database; no real mail is sent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000,
+                            help='Subscribers to seed')
+        parser.add_argument('--latency', type=float, default=0,
+                            help='Seconds the sink waits before answering each message')
+        parser.add_argument('--failure-rate', type=float, default=0,
+                            help='Share of messages the sink rejects (0-1)')
+        parser.add_argument('--failure-code', type=int, default=550,
+                            help='SMTP code used for rejected messages')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Random seed for the failure pattern')
+        parser.add_argument('--tls-cert', default=None,
+                            help='PEM certificate + key: the sink offers STARTTLS and senders use it')
+        parser.add_argument('--engine', choices=['asyncio', 'threads'], default=None,
+                            help='Sender engine (default: EMAIL_SENDER_ENGINE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Parallel SMTP sessions (default: EMAIL_ASYNC_CONCURRENCY or EMAIL_SENDER_CONCURRENCY)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Outbox rows per batch (default: EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--messages-per-connection', type=int, default=None,
+                            help='Reconnect after this many messages (default: EMAIL_MESSAGES_PER_CONNECTION)')
+        parser.add_argument('--no-preencoded', action='store_true',
+                            help='Build every message from scratch instead of the pre-encoded fan-out')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with SMTPSink(options['latency'], options['failure_rate'],
+                          options['failure_code'], options['seed'], options['tls_cert']) as sink:
+                self.run(sink, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, sink, options):
+        story = self.seed(options['subscribers'])
+
+        overrides = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': sink.port,
+            'EMAIL_USE_TLS': bool(options['tls_cert']),
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            'EMAIL_PREENCODED_FANOUT': not options['no_preencoded'],
+        }
+        if options['messages_per_connection']:
+            overrides['EMAIL_MESSAGES_PER_CONNECTION'] = options['messages_per_connection']
+
+        with override_settings(**overrides):
+            started = time.perf_counter()
+            notify_subscribers(story.id)
+            recorder = DeliveryRecorder()
+            with get_sender_pool(concurrency=options['concurrency'], engine=options['engine']) as pool:
+                while process_outbox(options['batch_size'], sender=pool, recorder=recorder):
+                    pass
+                recorder.flush()
+            elapsed = time.perf_counter() - started
+
+        story.refresh_from_db()
+        messages = sink.accepted + sink.rejected
+        self.stdout.write(
+            f"Subscribers:      {options['subscribers']}\n"
+            f"Elapsed:          {elapsed:.2f}s\n"
+            f"Throughput:       {messages / elapsed:,.0f} msg/s\n"
+            f"SMTP p50 / p99:   {sink.percentile(50) * 1000:.1f} ms / {sink.percentile(99) * 1000:.1f} ms\n"
+            f"Accepted:         {sink.accepted} ({story.sent_count} recorded sent)\n"
+            f"Rejected:         {sink.rejected} ({story.failed_count} failed, "
+            f"{StoryDelivery.objects.filter(status='PENDING').count()} awaiting retry)\n"
+            f"SMTP connections: {sink.connections}\n"
+            f"Peak RSS:         {self.peak_rss()}"
+        )
+
+    def seed(self, count):
+        Subscriber.objects.bulk_create([
+            Subscriber(
+                email=f"reader{i}@example.com",
+                name=f"Reader {i}",
+                is_active=True,
+                is_verified=True,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        author = User.objects.create(username='benchmark', first_name='Benchmark', last_name='Author')
+        return Story.objects.create(
+            headline="Community water project reaches 10,000 households",
+            snippet="A borehole rehabilitation programme in Masvingo has restored safe water "
+                    "access to rural communities ahead of the dry season.",
+            content="<p>Benchmark story body.</p>",
+            read_time="4 min",
+            author=author,
+            status='PUBLISHED',
+        )
+
+    def peak_rss(self):
+        if resource is None:
+            return "unavailable on this platform"
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        megabytes = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+        return f"{megabytes:.1f} MB"
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from publisher.utils.outbox_utils import publish_due_stories
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish SCHEDULED stories whose publish time has passed and queue "
+        "their notifications. Run every minute from cron, or with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep checking until stopped instead of exiting')
+        parser.add_argument('--sleep', type=float, default=60.0,
+                            help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            published = publish_due_stories()
+            for story_id in published:
+                self.stdout.write(f"Published story {story_id}")
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS("Scheduled stories checked"))
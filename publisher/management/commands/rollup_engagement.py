@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from publisher.utils.engagement_utils import prune_unresponsive, rollup_engagement
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll email opens and clicks up into each subscriber's engagement "
+        "score. Run daily from cron; --prune also deactivates subscribers "
+        "who never answered a re-engagement email. Hits still buffered in "
+        "the web processes (up to EMAIL_TRACKING_FLUSH_INTERVAL old) are "
+        "written by those processes and counted on the next run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help='Deactivate subscribers past EMAIL_REENGAGEMENT_GRACE_DAYS without engaging')
+
+    def handle(self, *args, **options):
+        updated = rollup_engagement()
+        self.stdout.write(f"Engagement rolled up for {updated} subscribers")
+
+        if options['prune']:
+            pruned = prune_unresponsive()
+            self.stdout.write(f"Deactivated {pruned} unresponsive subscribers")
+
+        self.stdout.write(self.style.SUCCESS("Engagement rollup complete"))
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from publisher.utils.digest_utils import schedule_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Collect the stories, vacancies and important notices published in the "
+        "last day or week into one digest and queue it for digest subscribers. "
+        "Run daily from cron (and weekly with --frequency weekly); send_outbox delivers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frequency', choices=['daily', 'weekly'], default='daily')
+        parser.add_argument('--date', default=None,
+                            help='Period end date, YYYY-MM-DD (default: today)')
+
+    def handle(self, *args, **options):
+        end_date = None
+        if options['date']:
+            try:
+                end_date = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+
+        digest, started = schedule_digest(options['frequency'].upper(), end_date)
+        if started:
+            self.stdout.write(self.style.SUCCESS(f"Queued {digest}"))
+        else:
+            self.stdout.write(f"Nothing to send for {digest}")
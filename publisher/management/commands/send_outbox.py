@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from publisher.utils.email_utils import get_sender_pool
+from publisher.utils.outbox_utils import DeliveryRecorder, process_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued emails (transactional mail first, then story "
+        "notifications, then re-engagement mail). Runs until stopped; "
+        "use --once from cron to drain the outbox and exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows to claim per batch (default: EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as there is nothing due')
+        parser.add_argument('--engine', choices=['asyncio', 'threads'], default=None,
+                            help='Sender engine (default: EMAIL_SENDER_ENGINE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Parallel SMTP sessions (default: EMAIL_ASYNC_CONCURRENCY or EMAIL_SENDER_CONCURRENCY)')
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help='Seconds to wait when the outbox is empty')
+
+    def handle(self, *args, **options):
+        total = 0
+        recorder = DeliveryRecorder()
+        with get_sender_pool(concurrency=options['concurrency'], engine=options['engine']) as pool:
+            try:
+                while True:
+                    processed = process_outbox(options['batch_size'], sender=pool, recorder=recorder)
+                    total += processed
+                    # After a failed SMTP session (e.g. a wrong relay password) claim
+                    # nothing more until the pool's backoff runs out
+                    wait = pool.relay_wait()
+                    if processed and not wait:
+                        continue
+                    # Nothing due: write out buffered results before idling
+                    recorder.flush()
+                    if options['once']:
+                        break
+                    time.sleep(wait or options['sleep'])
+            finally:
+                recorder.flush()
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {total} emails processed"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from publisher.utils.engagement_utils import queue_reengagement
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue a re-engagement email to the next batch of dormant "
+        "subscribers. Kept apart from story fan-outs; run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Subscribers to email (default: EMAIL_REENGAGEMENT_BATCH)')
+
+    def handle(self, *args, **options):
+        queued = queue_reengagement(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} re-engagement emails"))
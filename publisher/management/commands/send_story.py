@@ -0,0 +1,120 @@
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from publisher.models import Story
+from publisher.utils.email_utils import get_sender_pool
+from publisher.utils.outbox_utils import DeliveryRecorder, release_stale_claims
+from publisher.utils.shard_utils import (
+    expand_shard,
+    reclaim_shard,
+    reconcile_counts,
+    send_shard,
+    shard_ranges,
+    story_progress,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a published story's notifications from N worker processes, "
+        "each owning a Subscriber.id range and its own SMTP connections. "
+        "A single shard can be (re)run on its own with --shard LOW:HIGH."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('story_id', type=int)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes (one shard each)')
+        parser.add_argument('--shard', default=None,
+                            help='Run only the subscribers with LOW <= id < HIGH, e.g. 1:5000')
+        parser.add_argument('--reclaim', action='store_true',
+                            help="Requeue in-flight rows left by a crashed run of the shard(s)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows to claim per batch (default: EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--engine', choices=['asyncio', 'threads'], default=None,
+                            help='Sender engine (default: EMAIL_SENDER_ENGINE)')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Parallel SMTP sessions per worker (default: EMAIL_ASYNC_CONCURRENCY or EMAIL_SENDER_CONCURRENCY)')
+        parser.add_argument('--poll', type=float, default=5.0,
+                            help='Seconds between progress reports')
+
+    def handle(self, *args, **options):
+        try:
+            story = Story.objects.get(id=options['story_id'], status='PUBLISHED')
+        except Story.DoesNotExist:
+            raise CommandError(f"Published story {options['story_id']} not found")
+
+        if options['shard']:
+            self.run_shard(story, options)
+        else:
+            self.coordinate(story, options)
+
+    def run_shard(self, story, options):
+        try:
+            low, high = (int(bound) for bound in options['shard'].split(':'))
+        except ValueError:
+            raise CommandError("--shard must look like LOW:HIGH")
+
+        if options['reclaim']:
+            reclaim_shard(story, low, high)
+        release_stale_claims()
+        queued = expand_shard(story, low, high, options['batch_size'])
+
+        recorder = DeliveryRecorder()
+        with get_sender_pool(concurrency=options['concurrency'], engine=options['engine']) as pool:
+            sent, failed = send_shard(story, low, high, pool, recorder, options['batch_size'])
+        self.stdout.write(f"Shard {low}:{high}: {queued} queued, {sent} sent, {failed} failed")
+
+    def coordinate(self, story, options):
+        # The shards cover every recipient; stop the send_outbox worker expanding it too
+        Story.objects.filter(id=story.id).update(notify_cursor=None)
+
+        ranges = shard_ranges(story, options['workers'])
+        if not ranges:
+            self.stdout.write("No recipients for this story")
+            return
+
+        workers = []
+        for low, high in ranges:
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'send_story', str(story.id),
+                '--shard', f"{low}:{high}",
+            ]
+            for option in ('batch_size', 'engine', 'concurrency'):
+                if options[option]:
+                    command += [f"--{option.replace('_', '-')}", str(options[option])]
+            if options['reclaim']:
+                command.append('--reclaim')
+            self.stdout.write(f"Starting shard {low}:{high}")
+            workers.append((command, subprocess.Popen(command)))
+
+        while any(process.poll() is None for _, process in workers):
+            time.sleep(options['poll'])
+            self.report(story.id)
+
+        counts = reconcile_counts(story.id)
+        self.stdout.write(
+            f"Story {story.id}: {counts['SENT']} sent, {counts['FAILED']} failed, "
+            f"{counts['PENDING'] + counts['SENDING']} still queued"
+        )
+
+        failed_shards = [command for command, process in workers if process.returncode]
+        for command in failed_shards:
+            if '--reclaim' not in command:
+                command = command + ['--reclaim']
+            self.stderr.write(f"Shard exited with an error; restart it with: manage.py {' '.join(command[2:])}")
+        if failed_shards:
+            raise CommandError(f"{len(failed_shards)} of {len(workers)} shards failed")
+
+    def report(self, story_id):
+        counts = story_progress(story_id)
+        total = sum(counts.values())
+        done = counts['SENT'] + counts['FAILED'] + counts['SKIPPED']
+        self.stdout.write(
+            f"Progress: {done}/{total} done "
+            f"({counts['SENT']} sent, {counts['FAILED']} failed, {counts['SKIPPED']} skipped)"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0016_storydelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='notify_cursor',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
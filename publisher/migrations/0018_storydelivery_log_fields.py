@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0017_story_notify_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storydelivery',
+            name='last_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='storydelivery',
+            name='smtp_code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
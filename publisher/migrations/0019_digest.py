@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_subscriber_delivery_mode'),
+        ('publisher', '0018_storydelivery_log_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storydelivery',
+            name='story',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='publisher.story'),
+        ),
+        migrations.CreateModel(
+            name='Digest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('DAILY', 'Daily'), ('WEEKLY', 'Weekly')], max_length=10)),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('sent_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('notify_cursor', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'constraints': [models.UniqueConstraint(fields=('frequency', 'period_start'), name='unique_digest_period')],
+            },
+        ),
+        migrations.AddField(
+            model_name='storydelivery',
+            name='digest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='publisher.digest'),
+        ),
+        migrations.AddConstraint(
+            model_name='storydelivery',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('digest__isnull', True), ('story__isnull', False)), models.Q(('digest__isnull', False), ('story__isnull', True)), _connector='OR'), name='storydelivery_story_or_digest'),
+        ),
+    ]
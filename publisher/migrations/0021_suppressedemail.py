@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0020_transactionalemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuppressedEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('is_suppressed', models.BooleanField(default=False)),
+                ('reason', models.CharField(blank=True, choices=[('BOUNCE', 'Hard bounce'), ('FAILURES', 'Repeated failures')], max_length=10)),
+                ('failure_count', models.PositiveIntegerField(default=0)),
+                ('smtp_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_subscriber_delivery_mode'),
+        ('publisher', '0021_suppressedemail'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='storydelivery',
+            constraint=models.UniqueConstraint(fields=('story', 'subscriber'), name='unique_story_delivery'),
+        ),
+        migrations.AddConstraint(
+            model_name='storydelivery',
+            constraint=models.UniqueConstraint(fields=('digest', 'subscriber'), name='unique_digest_delivery'),
+        ),
+    ]
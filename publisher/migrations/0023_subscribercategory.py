@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_subscriber_content_preferences'),
+        ('publisher', '0022_storydelivery_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriberCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriber_preferences', to='publisher.category')),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_preferences', to='accounts.subscriber')),
+            ],
+            options={
+                'verbose_name_plural': 'Subscriber categories',
+                'indexes': [models.Index(fields=['category', 'subscriber'], name='publisher_s_categor_822dd9_idx')],
+                'constraints': [models.UniqueConstraint(fields=('subscriber', 'category'), name='unique_subscriber_category')],
+            },
+        ),
+    ]
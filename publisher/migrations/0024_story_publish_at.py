@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0023_subscribercategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='publish_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='status',
+            field=models.CharField(choices=[('DRAFT', 'Draft'), ('SCHEDULED', 'Scheduled'), ('PUBLISHED', 'Published'), ('ARCHIVED', 'Archived')], default='DRAFT', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['status', 'publish_at'], name='publisher_s_status_115454_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0024_story_publish_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storydelivery',
+            name='clicked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='storydelivery',
+            name='opened_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0025_storydelivery_engagement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedStoryEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('subject', models.CharField(max_length=255)),
+                ('plain_body', models.TextField()),
+                ('html_body', models.TextField()),
+                ('digest_html', models.TextField()),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+                ('story', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rendered_email', to='publisher.story')),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0026_renderedstoryemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notice',
+            index=models.Index(fields=['is_active', 'created_at'], name='publisher_n_is_acti_59b657_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notice',
+            index=models.Index(fields=['is_active', 'publish_date'], name='publisher_n_is_acti_84102b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['status', 'created_at'], name='publisher_s_status_4f074e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['status', 'headline'], name='publisher_s_status_8314f3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(fields=['is_active', 'created_at'], name='publisher_v_is_acti_a17e68_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(fields=['is_active', 'application_deadline'], name='publisher_v_is_acti_e58a92_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0027_list_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storydelivery',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('SKIPPED', 'Skipped')], default='PENDING', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='transactionalemail',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('SKIPPED', 'Skipped')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -6,7 +6,7 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 import re
-from accounts.models import User
+from accounts.models import User, Subscriber
 
 
 class GenericAttachment(models.Model):
@@ -97,9 +97,31 @@ class Category(models.Model):
         return self.name
 
 
+class SubscriberCategory(models.Model):
+    """
+    A category a subscriber wants stories from. Subscribers with no rows
+    get every category.
+    """
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.CASCADE, related_name='category_preferences')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='subscriber_preferences')
+    
+    class Meta:
+        verbose_name_plural = "Subscriber categories"
+        constraints = [
+            models.UniqueConstraint(fields=['subscriber', 'category'], name='unique_subscriber_category'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'subscriber']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subscriber.email} -> {self.category}"
+
+
 class Story(models.Model):
     STATUS_CHOICES = [
         ('DRAFT', 'Draft'),
+        ('SCHEDULED', 'Scheduled'),
         ('PUBLISHED', 'Published'),
         ('ARCHIVED', 'Archived'),
     ]
@@ -112,13 +134,26 @@ class Story(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     published_at = models.DateTimeField(null=True, blank=True)
+    # When a SCHEDULED story goes live (see the publish_scheduled command)
+    publish_at = models.DateTimeField(null=True, blank=True)
     sent_count = models.IntegerField(default=0)
     failed_count = models.IntegerField(default=0)
     
+    # Last Subscriber.id queued for notification; null when no fan-out is in progress
+    notify_cursor = models.BigIntegerField(null=True, blank=True)
+    
     # Thumbnail and category fields
     thumbnail = models.ImageField(upload_to='blog_thumbnails/', null=True, blank=True)
     category = models.ForeignKey('Category', on_delete=models.SET_NULL, null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'publish_at']),
+            # Sort keys of the public stories API (see projection_utils.STORY_SORT_KEYS)
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'headline']),
+        ]
+    
     def extract_first_image(self):
         """Extract first image URL from content for use as thumbnail"""
         img_pattern = r'<img[^>]+src="([^">]+)"'
@@ -189,6 +224,13 @@ class Vacancy(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Sort keys of the public vacancies API (see projection_utils.VACANCY_SORT_KEYS)
+            models.Index(fields=['is_active', 'created_at']),
+            models.Index(fields=['is_active', 'application_deadline']),
+        ]
+    
     # Property to get all attachments for this vacancy
     @property
     def attachments(self):
@@ -242,6 +284,13 @@ class Notice(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Sort keys of the public notices API (see projection_utils.NOTICE_SORT_KEYS)
+            models.Index(fields=['is_active', 'created_at']),
+            models.Index(fields=['is_active', 'publish_date']),
+        ]
+    
     # Property to get all attachments for this notice
     @property
     def attachments(self):
@@ -267,4 +316,211 @@ class Notice(models.Model):
             'TENDER': 'warning',
             'ANNOUNCEMENT': 'info'
         }
-        return colors.get(self.category, 'secondary')
\ No newline at end of file
+        return colors.get(self.category, 'secondary')
+
+
+class Digest(models.Model):
+    """A daily or weekly roundup of everything published in one period"""
+    FREQUENCIES = [
+        ('DAILY', 'Daily'),
+        ('WEEKLY', 'Weekly'),
+    ]
+    
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES)
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    sent_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    
+    # Last Subscriber.id queued for this digest; null when no fan-out is in progress
+    notify_cursor = models.BigIntegerField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['frequency', 'period_start'], name='unique_digest_period'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_frequency_display()} digest {self.period_start:%Y-%m-%d}"
+    
+    def stories(self):
+        return Story.objects.filter(
+            status='PUBLISHED',
+            published_at__gte=self.period_start,
+            published_at__lt=self.period_end
+        ).select_related('author', 'category').order_by('-published_at')
+    
+    def vacancies(self):
+        return Vacancy.objects.filter(
+            is_active=True,
+            created_at__gte=self.period_start,
+            created_at__lt=self.period_end
+        ).order_by('-created_at')
+    
+    def notices(self):
+        return Notice.objects.filter(
+            is_active=True,
+            is_important=True,
+            created_at__gte=self.period_start,
+            created_at__lt=self.period_end
+        ).order_by('-created_at')
+    
+    def is_empty(self):
+        return not (self.stories().exists() or self.vacancies().exists() or self.notices().exists())
+
+class OutboxMessage(models.Model):
+    """Delivery state shared by every kind of queued email"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+        # Unsubscribed or suppressed between queueing and sending
+        ('SKIPPED', 'Skipped'),
+    ]
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    
+    # Retry bookkeeping
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    smtp_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    
+    # Auto fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_attempt_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        abstract = True
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class StoryDelivery(OutboxMessage):
+    """
+    Outbox row and delivery log for one notification email to one
+    subscriber: either a single story or a digest
+    """
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, null=True, blank=True, related_name='deliveries')
+    digest = models.ForeignKey(Digest, on_delete=models.CASCADE, null=True, blank=True, related_name='deliveries')
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.SET_NULL, null=True, blank=True)
+    email = models.EmailField()
+    # First open (tracking pixel) and first click, written in batches
+    opened_at = models.DateTimeField(null=True, blank=True)
+    clicked_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta(OutboxMessage.Meta):
+        verbose_name_plural = "Story deliveries"
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(story__isnull=False, digest__isnull=True) |
+                    models.Q(story__isnull=True, digest__isnull=False)
+                ),
+                name='storydelivery_story_or_digest',
+            ),
+            # One notification per subscriber per story (or digest), however
+            # many times it is published
+            models.UniqueConstraint(fields=['story', 'subscriber'], name='unique_story_delivery'),
+            models.UniqueConstraint(fields=['digest', 'subscriber'], name='unique_digest_delivery'),
+        ]
+    
+    @property
+    def source(self):
+        """The Story or Digest this email belongs to"""
+        return self.story if self.story_id else self.digest
+    
+    def __str__(self):
+        return f"{self.source} -> {self.email} ({self.status})"
+
+
+
+class RenderedStoryEmail(models.Model):
+    """
+    A story's notification email rendered once, per-recipient slot markers
+    and all, and reused by every send, preview and digest until a field it
+    shows (or its template) changes. See utils/story_email_utils.py.
+    """
+    story = models.OneToOneField(Story, on_delete=models.CASCADE, related_name='rendered_email')
+    content_hash = models.CharField(max_length=64)
+    subject = models.CharField(max_length=255)
+    plain_body = models.TextField()
+    html_body = models.TextField()
+    # The story's entry in digest emails
+    digest_html = models.TextField()
+    rendered_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Rendered email for {self.story}"
+
+class QueuedEmail(OutboxMessage):
+    """An outbox row carrying a complete, already rendered email"""
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    email = models.EmailField()
+    
+    class Meta(OutboxMessage.Meta):
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.subject} -> {self.email} ({self.status})"
+
+
+class TransactionalEmail(QueuedEmail):
+    """
+    A one-off email (subscription confirmation, password reset code)
+    queued by a view and sent by the send_outbox worker
+    """
+
+
+class ReengagementEmail(QueuedEmail):
+    """
+    A "still interested?" email to a dormant subscriber. Bulk mail: the
+    send_outbox worker only claims it after transactional mail and story
+    notifications.
+    """
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.SET_NULL, null=True, blank=True)
+
+
+class SuppressedEmail(models.Model):
+    """
+    Addresses we have stopped mailing: a permanent (5xx) SMTP failure
+    suppresses immediately, soft failures once they reach
+    EMAIL_SUPPRESS_AFTER_FAILURES. Emails are stored normalised.
+    """
+    REASON_CHOICES = [
+        ('BOUNCE', 'Hard bounce'),
+        ('FAILURES', 'Repeated failures'),
+    ]
+    
+    email = models.EmailField(unique=True)
+    is_suppressed = models.BooleanField(default=False)
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES, blank=True)
+    failure_count = models.PositiveIntegerField(default=0)
+    smtp_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    # Auto fields
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+    
+    @staticmethod
+    def normalise(email):
+        return email.strip().lower()
+    
+    def __str__(self):
+        state = self.get_reason_display() if self.is_suppressed else f"{self.failure_count} failures"
+        return f"{self.email} ({state})"
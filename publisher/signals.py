@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import TeamMember, User
+
+from .models import Category, GenericAttachment, Notice, Story, Vacancy
+from .utils.cache_utils import bump_generation
+
+
+# ==========================================
+# PUBLIC API CACHE INVALIDATION
+# ==========================================
+
+# Category names are joined into the stories API
+@receiver([post_save, post_delete], sender=Story)
+@receiver([post_save, post_delete], sender=Vacancy)
+@receiver([post_save, post_delete], sender=Notice)
+@receiver([post_save, post_delete], sender=Category)
+def content_changed(sender, **kwargs):
+    bump_generation(sender)
+
+
+# Author names and TeamMember social links are joined into the stories API
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=TeamMember)
+def author_changed(sender, update_fields=None, **kwargs):
+    # Logging in only stamps last_login, which no response shows
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_generation(Story)
+
+
+@receiver([post_save, post_delete], sender=GenericAttachment)
+def attachment_changed(sender, instance, **kwargs):
+    """An attachment changes the responses of whatever it is attached to"""
+    model = instance.content_type.model_class()
+    if model is not None:
+        bump_generation(model)
@@ -1,3 +1,837 @@
-from django.test import TestCase
+import smtplib
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail import EmailMessage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Subscriber, TeamMember, User
+from publisher.models import (
+    Category, Digest, Notice, ReengagementEmail, RenderedStoryEmail, Story, StoryDelivery, SubscriberCategory,
+    SuppressedEmail, TransactionalEmail, Vacancy,
+)
+from publisher.utils.digest_utils import schedule_digest
+from publisher.utils.email_utils import Deferred, DomainThrottle, SenderPool, get_sender_pool
+from publisher.utils.engagement_utils import keep_subscribed, prune_unresponsive, queue_reengagement
+from publisher.utils.mime_utils import FanoutMessage
+from publisher.utils.outbox_utils import (
+    DeliveryRecorder, build_email, claim_batch, claim_rows, digest_recipients, expand_fanout,
+    expand_pending_notifications, process_outbox, publish_due_stories, queue_mail, recipient_values,
+    release_stale_claims, send_batch, start_story_notifications, story_recipients,
+)
+from publisher.utils.schedule_utils import spread_send_time
+from publisher.utils.shard_utils import expand_shard, shard_ranges
+from publisher.utils.smtp_sink import SMTPSink
+from publisher.utils.story_email_utils import invalidate_story_email, story_email
+from publisher.utils.suppression_utils import clear_soft_failures, is_suppressed, record_bounce, record_soft_failure
+from publisher.utils.token_utils import unsubscribe_url
+
+
+class ListApiQueryCountTests(TestCase):
+    """
+    The public list APIs read a page with one joined query (plus the
+    COUNT for page/page_size clients of the stories API), whatever
+    the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Health')
+        for i in range(12):
+            author = User.objects.create(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Author', last_name=str(i),
+            )
+            # Every other author has a team profile with social links
+            if i % 2:
+                TeamMember.objects.create(
+                    user=author, position='Writer', department='News', location='Harare',
+                    twitter_url=f'https://twitter.com/author{i}',
+                )
+            Story.objects.create(
+                headline=f'Story {i}', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+                author=author, category=category if i % 3 else None, status='PUBLISHED',
+            )
+            Vacancy.objects.create(
+                title=f'Vacancy {i}', organization='NGO', organization_details='Details',
+                location='Harare', application_deadline=date(2030, 1, 1), author=author,
+            )
+            Notice.objects.create(headline=f'Notice {i}', overview='Overview', organization='NGO', author=author)
+
+    def assertConstantQueries(self, url, queries, key):
+        for page_size in (2, 12):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(len(response.json()[key]), page_size)
+
+    def test_stories_page_mode(self):
+        self.assertConstantQueries(reverse('stories'), 2, 'stories')
+
+    def test_stories_cursor_mode(self):
+        for page_size in (2, 12):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('stories'), {'cursor': '', 'page_size': page_size})
+            self.assertEqual(len(response.json()['stories']), page_size)
+
+    def test_story_fields_from_joins(self):
+        response = self.client.get(reverse('stories'), {'page_size': 12})
+        stories = {story['headline']: story for story in response.json()['stories']}
+        self.assertEqual(stories['Story 1']['author'], 'Author 1')
+        self.assertEqual(stories['Story 1']['author_twitter'], 'https://twitter.com/author1')
+        self.assertEqual(stories['Story 1']['category'], 'Health')
+        self.assertEqual(stories['Story 0']['author_twitter'], '')
+        self.assertIsNone(stories['Story 0']['category'])
+
+    def test_homepage_stories(self):
+        for name in ('get_latest_stories', 'get_top_stories', 'get_editors_pick_stories'):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse(name))
+            self.assertEqual(len(response.json()['stories']), 6)
+
+    def test_vacancies(self):
+        self.assertConstantQueries(reverse('vacancies'), 1, 'vacancies')
+
+    def test_notices(self):
+        self.assertConstantQueries(reverse('notices'), 1, 'notices')
+
+
+class SparseFieldsetTests(TestCase):
+    """List APIs send a compact shape by default and exactly the fields= asked for"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com', first_name='Ann', last_name='Moyo')
+        Story.objects.create(
+            headline='Clean water', snippet='Boreholes restored', read_time='3 min', author=author, status='PUBLISHED',
+            content='<p>Intro</p><img src="/media/borehole.jpg"><p>' + 'Long body. ' * 500 + '</p>',
+        )
+        Vacancy.objects.create(
+            title='Field Officer', organization='NGO', organization_details='Details', location='Harare',
+            application_deadline=date(2030, 1, 1), author=author,
+            description='<p><strong>Role</strong> ' + 'Duties. ' * 200 + '</p>',
+        )
+
+    def test_default_shape_omits_html(self):
+        story = self.client.get(reverse('stories')).json()['stories'][0]
+        self.assertNotIn('content', story)
+        self.assertEqual(story['image_url'], '/media/borehole.jpg')
+
+        vacancy = self.client.get(reverse('vacancies')).json()['vacancies'][0]
+        self.assertNotIn('description', vacancy)
+        self.assertTrue(vacancy['excerpt'].startswith('Role Duties.'))
+        self.assertLessEqual(len(vacancy['excerpt']), 153)
+
+    def test_requested_fields_only(self):
+        response = self.client.get(reverse('stories'), {'fields': 'headline,content'})
+        story = response.json()['stories'][0]
+        self.assertEqual(set(story), {'headline', 'content'})
+        self.assertIn('Long body.', story['content'])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('notices'), {'fields': 'headline,secret'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ListApiSortAndSizeTests(TestCase):
+    """List APIs only sort on indexed keys, cap page_size and hide drafts / inactive rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        for i in range(3):
+            Story.objects.create(
+                headline=f'Story {i}', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+                author=author, status='PUBLISHED' if i else 'DRAFT',
+            )
+            Notice.objects.create(
+                headline=f'Notice {i}', overview='Overview', organization='NGO', author=author, is_active=bool(i),
+            )
+
+    def test_unknown_sort_key(self):
+        for name in ('stories', 'vacancies', 'notices'):
+            for params in ({'sort_by': 'content'}, {'sort_by': 'content', 'cursor': ''}):
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_bad_page_size(self):
+        for page_size in ('abc', '0'):
+            response = self.client.get(reverse('stories'), {'page_size': page_size})
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(API_MAX_PAGE_SIZE=1)
+    def test_page_size_cap(self):
+        response = self.client.get(reverse('stories'), {'page_size': 1000})
+        self.assertEqual(len(response.json()['stories']), 1)
+        self.assertEqual(response.json()['pages'], 2)
+
+    def test_drafts_and_inactive_hidden(self):
+        stories = self.client.get(reverse('stories'), {'sort_by': 'headline'}).json()['stories']
+        self.assertEqual([story['headline'] for story in stories], ['Story 1', 'Story 2'])
+        notices = self.client.get(reverse('notices'), {'cursor': ''}).json()['notices']
+        self.assertEqual(len(notices), 2)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-tests'},
+})
+class ResponseCacheTests(TestCase):
+    """List API responses are served from cache until the content they show changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author', email='author@example.com')
+        cls.notice = Notice.objects.create(headline='Notice', overview='Overview', organization='NGO', author=cls.author)
+
+    def setUp(self):
+        caches['api'].clear()
+
+    def test_cached_until_saved(self):
+        url = reverse('notices')
+        first = self.client.get(url, {'page': 1, 'page_size': 6})
+        with self.assertNumQueries(0):
+            # Parameter order does not matter
+            cached = self.client.get(url, {'page_size': 6, 'page': 1})
+        self.assertEqual(cached.json(), first.json())
+
+        self.notice.headline = 'Updated'
+        self.notice.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'page': 1, 'page_size': 6})
+        self.assertEqual(response.json()['notices'][0]['headline'], 'Updated')
+
+    def test_author_edit_invalidates_stories(self):
+        Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=self.author, status='PUBLISHED',
+        )
+        url = reverse('stories')
+        self.client.get(url)
+
+        self.author.first_name, self.author.last_name = 'Ann', 'Moyo'
+        self.author.save()
+        self.assertEqual(self.client.get(url).json()['stories'][0]['author'], 'Ann Moyo')
+
+        TeamMember.objects.create(
+            user=self.author, position='Writer', department='News', location='Harare',
+            twitter_url='https://twitter.com/ann',
+        )
+        self.client.get(url, {'fields': 'author_twitter'})
+        self.author.team_profile.twitter_url = 'https://twitter.com/ann_moyo'
+        self.author.team_profile.save()
+        story = self.client.get(url, {'fields': 'author_twitter'}).json()['stories'][0]
+        self.assertEqual(story['author_twitter'], 'https://twitter.com/ann_moyo')
+
+    def test_delete_invalidates(self):
+        url = reverse('notices')
+        self.client.get(url)
+        Notice.objects.create(headline='Second', overview='Overview', organization='NGO', author=self.author).delete()
+        self.notice.delete()
+        self.assertEqual(self.client.get(url).json()['notices'], [])
+
+
+
+class DeliveryRecorderTests(TestCase):
+    """Only the recipient's own refusals count against an address"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+
+    def record(self, error):
+        delivery = StoryDelivery.objects.create(story=self.story, email='reader@example.com')
+        recorder = DeliveryRecorder()
+        recorder.record(delivery, error)
+        recorder.flush()
+        delivery.refresh_from_db()
+        return delivery
+
+    def test_session_errors_wait_for_the_relay(self):
+        for error in (
+            smtplib.SMTPAuthenticationError(535, b'Authentication failed'),
+            smtplib.SMTPSenderRefused(550, b'Sender rejected', 'news@example.com'),
+            ConnectionRefusedError(111, 'Connection refused'),
+        ):
+            delivery = self.record(error)
+            self.assertEqual((delivery.status, delivery.attempts), ('PENDING', 0))
+            delivery.delete()
+        self.assertFalse(SuppressedEmail.objects.exists())
+
+    def test_content_reject_fails_without_suppression(self):
+        delivery = self.record(smtplib.SMTPDataError(552, b'Message too large'))
+        self.assertEqual((delivery.status, delivery.attempts), ('FAILED', 1))
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.failed_count, 1)
+        self.assertFalse(SuppressedEmail.objects.exists())
+
+    def test_unknown_errors_reach_the_cap(self):
+        delivery = self.record(UnicodeEncodeError('ascii', 'é', 0, 1, 'bad header'))
+        self.assertEqual((delivery.status, delivery.attempts), ('PENDING', 1))
+        delivery.attempts = 4
+        recorder = DeliveryRecorder()
+        recorder.record(delivery, ValueError('bad header'))
+        recorder.flush()
+        self.assertEqual(delivery.status, 'FAILED')
+
+    def test_recipient_refusal_bounces(self):
+        delivery = self.record(smtplib.SMTPRecipientsRefused({'reader@example.com': (550, b'No such user')}))
+        self.assertEqual(delivery.status, 'FAILED')
+        self.assertTrue(SuppressedEmail.objects.get(email='reader@example.com').is_suppressed)
+
+    def test_temporary_reply_counts_as_attempt(self):
+        error = smtplib.SMTPDataError(450, b'Mailbox full')
+        delivery = self.record(error)
+        self.assertEqual((delivery.status, delivery.attempts), ('PENDING', 1))
+
+        delivery.attempts = 4
+        recorder = DeliveryRecorder()
+        recorder.record(delivery, error)
+        recorder.flush()
+        self.assertEqual(delivery.status, 'FAILED')
+
+    def test_only_421_backs_off_the_domain(self):
+        pool = SenderPool(concurrency=1)
+        message = EmailMessage(to=['reader@example.com'])
+        self.assertNotIsInstance(pool._outcome(message, smtplib.SMTPDataError(450, b'Mailbox full')), Deferred)
+        self.assertFalse(pool.throttle('example.com').backoff)
+        self.assertIsInstance(pool._outcome(message, smtplib.SMTPDataError(421, b'Closing')), Deferred)
+
+    def test_session_error_stops_the_batch(self):
+        class RefusingSender:
+            calls = 0
+
+            def send_messages(self, messages):
+                self.calls += 1
+                return [smtplib.SMTPAuthenticationError(535, b'Authentication failed')]
+
+        pool = SenderPool(concurrency=1)
+        sender = RefusingSender()
+        pool._submit = lambda job: self._send_now(pool, sender, job)
+        pool._join = lambda: None
+        messages = [EmailMessage(to=[f'reader{i}@example.com']) for i in range(5)]
+        results = pool.send_messages(messages)
+        self.assertEqual(sender.calls, 1)
+        self.assertTrue(all(isinstance(result, Deferred) for result in results))
+        first_wait = pool.relay_wait()
+        self.assertGreater(first_wait, 0)
+
+        pool.relay.resume_at = 0
+        pool.send_messages(messages[:1])
+        self.assertGreater(pool.relay.backoff, first_wait)
+
+    @staticmethod
+    def _send_now(pool, sender, job):
+        index, message, results = job
+        results[index] = pool._held_back(message) or pool._outcome(message, sender.send_messages([message])[0])
+
+
+class DigestCategoryTests(TestCase):
+    """Digests only carry stories from the categories a subscriber follows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        health, education = Category.objects.create(name='Health'), Category.objects.create(name='Education')
+        now = timezone.now()
+        for category in (health, education):
+            Story.objects.create(
+                headline=f'{category.name} story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+                author=author, category=category, status='PUBLISHED', published_at=now,
+            )
+        cls.digest = Digest.objects.create(frequency='DAILY', period_start=now - timedelta(days=1), period_end=now + timedelta(hours=1))
+        cls.follower = Subscriber.objects.create(email='health@example.com', is_verified=True, delivery_mode='DAILY')
+        SubscriberCategory.objects.create(subscriber=cls.follower, category=health)
+        cls.other = Subscriber.objects.create(
+            email='other@example.com', is_verified=True, delivery_mode='DAILY',
+            receive_vacancies=False, receive_notices=False,
+        )
+        SubscriberCategory.objects.create(subscriber=cls.other, category=Category.objects.create(name='Water'))
+        cls.everyone = Subscriber.objects.create(email='all@example.com', is_verified=True, delivery_mode='DAILY')
+
+    def test_digest_filtered_by_category(self):
+        delivery = StoryDelivery.objects.create(digest=self.digest, subscriber=self.follower, email=self.follower.email)
+        _, plain_message, _ = build_email(delivery)
+        self.assertIn('Health story', plain_message.render({}))
+        self.assertNotIn('Education story', plain_message.render({}))
+
+    def test_recipients_with_nothing_to_read_skipped(self):
+        recipients = set(digest_recipients(self.digest).values_list('email', flat=True))
+        self.assertEqual(recipients, {'health@example.com', 'all@example.com'})
+
+
+class StoryFanoutTests(TestCase):
+    """Unpublishing stops a story's notifications; republishing reaches only those it missed"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='secret')
+        self.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=self.author, status='PUBLISHED',
+        )
+        for i in range(7):
+            Subscriber.objects.create(email=f'reader{i}@example.com', is_verified=True)
+        self.client.force_login(self.author)
+        start_story_notifications(self.story.id)
+
+    def send_next(self, batch_size):
+        expand_pending_notifications(batch_size)
+        with SenderPool(concurrency=1) as pool:
+            send_batch(claim_batch(batch_size), pool)
+
+    def drain(self):
+        for _ in range(10):
+            self.send_next(3)
+
+    def recipients(self):
+        return sorted(message.to[0] for message in mail.outbox)
+
+    def test_unpublish_mid_send(self):
+        self.send_next(2)
+        self.assertEqual(len(mail.outbox), 2)
+
+        self.client.post(reverse('story_unpublish', args=[self.story.id]))
+        self.story.refresh_from_db()
+        self.assertIsNone(self.story.notify_cursor)
+        self.assertFalse(StoryDelivery.objects.filter(story=self.story, status='PENDING').exists())
+
+        # A row queued before the unpublish (e.g. by a shard) is not claimed either
+        StoryDelivery.objects.create(story=self.story, email='late@example.com')
+        start_story_notifications(self.story.id)
+        self.drain()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_republish_reaches_the_rest_once(self):
+        self.send_next(2)
+        self.client.post(reverse('story_unpublish', args=[self.story.id]))
+        self.client.post(reverse('story_publish', args=[self.story.id]))
+        self.drain()
+        self.assertEqual(self.recipients(), [f'reader{i}@example.com' for i in range(7)])
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.sent_count, 7)
+
+    def test_unsubscribed_after_queueing_skipped(self):
+        expand_pending_notifications(10)
+        Subscriber.objects.filter(email='reader0@example.com').update(is_active=False)
+        SuppressedEmail.objects.create(email='reader1@example.com', is_suppressed=True, reason='BOUNCE')
+        self.drain()
+        self.assertNotIn('reader0@example.com', self.recipients())
+        self.assertNotIn('reader1@example.com', self.recipients())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(StoryDelivery.objects.filter(story=self.story, status='SKIPPED').count(), 2)
+
+
+class OutboxTests(TestCase):
+    """Queued mail is claimed once, transactional mail first, and retried with backoff"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        StoryDelivery.objects.bulk_create([
+            StoryDelivery(story=cls.story, email=f'reader{i}@example.com') for i in range(4)
+        ])
+
+    def test_transactional_mail_first(self):
+        queue_mail('Confirm', 'Body', ['new@example.com'])
+        batch = claim_batch(2)
+        self.assertIsInstance(batch[0], TransactionalEmail)
+        self.assertIsInstance(batch[1], StoryDelivery)
+
+    def test_claimed_rows_not_claimed_again(self):
+        first = claim_rows(StoryDelivery, 2)
+        second = claim_rows(StoryDelivery, 2)
+        self.assertFalse({row.id for row in first} & {row.id for row in second})
+        self.assertEqual(claim_rows(StoryDelivery, 2), [])
+
+        # A worker that died mid-batch: its rows go back once the claim times out
+        StoryDelivery.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(release_stale_claims(), 4)
+        self.assertEqual(len(claim_rows(StoryDelivery, 10)), 4)
+
+    def test_retry_delay_doubles(self):
+        delivery = claim_rows(StoryDelivery, 1)[0]
+        recorder = DeliveryRecorder()
+        delays = []
+        for _ in range(2):
+            started = timezone.now()
+            recorder.record(delivery, smtplib.SMTPDataError(451, b'Try again later'))
+            delays.append(round((delivery.next_attempt_at - started).total_seconds()))
+        self.assertEqual(delays, [60, 120])
+
+    def test_counters_written_on_flush(self):
+        recorder = DeliveryRecorder(flush_every=10)
+        for delivery in claim_rows(StoryDelivery, 3):
+            recorder.record(delivery, None)
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.sent_count, 0)
+        recorder.flush()
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.sent_count, 3)
+        self.assertEqual(StoryDelivery.objects.filter(status='SENT').count(), 3)
+
+
+class FanoutResumeTests(TestCase):
+    """A fan-out is expanded chunk by chunk from its checkpoint and never queues anyone twice"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        cls.subscribers = [
+            Subscriber.objects.create(email=f'reader{i}@example.com', is_verified=True) for i in range(7)
+        ]
+
+    def test_resumes_from_cursor(self):
+        start_story_notifications(self.story.id)
+        self.assertEqual(expand_fanout(Story, self.story.id, chunk_size=3), 3)
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.notify_cursor, self.subscribers[2].id)
+
+        self.assertEqual(expand_fanout(Story, self.story.id, chunk_size=3), 3)
+        self.assertEqual(expand_fanout(Story, self.story.id, chunk_size=3), 1)
+        self.assertEqual(expand_fanout(Story, self.story.id, chunk_size=3), 0)
+        self.story.refresh_from_db()
+        self.assertIsNone(self.story.notify_cursor)
+        self.assertEqual(StoryDelivery.objects.filter(story=self.story).count(), 7)
+
+    def test_restart_queues_nobody_twice(self):
+        start_story_notifications(self.story.id)
+        expand_fanout(Story, self.story.id, chunk_size=5)
+        start_story_notifications(self.story.id)
+        while expand_fanout(Story, self.story.id, chunk_size=5):
+            pass
+        self.assertEqual(StoryDelivery.objects.filter(story=self.story).count(), 7)
+
+
+class SenderEngineTests(TestCase):
+    """Both sender engines deliver a fan-out to an SMTP server over a few long-lived sessions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        for i in range(12):
+            Subscriber.objects.create(email=f'reader{i}@example.com', is_verified=True)
+
+    def deliver(self, engine):
+        with SMTPSink() as sink, override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        ):
+            start_story_notifications(self.story.id)
+            recorder = DeliveryRecorder()
+            with get_sender_pool(concurrency=2, engine=engine) as pool:
+                while process_outbox(5, sender=pool, recorder=recorder):
+                    pass
+            recorder.flush()
+        self.story.refresh_from_db()
+        return sink
+
+    def test_threads(self):
+        sink = self.deliver('threads')
+        self.assertEqual((sink.accepted, self.story.sent_count), (12, 12))
+        self.assertLessEqual(sink.connections, 2)
+
+    def test_asyncio(self):
+        sink = self.deliver('asyncio')
+        self.assertEqual((sink.accepted, self.story.sent_count), (12, 12))
+        self.assertLessEqual(sink.connections, 2)
+
+
+class FanoutMessageTests(TestCase):
+    """The story email is encoded once; every recipient's copy carries their own links"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com', first_name='Ann')
+        cls.story = Story.objects.create(
+            headline='Clean water', snippet='Boreholes restored', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        cls.readers = [
+            Subscriber.objects.create(email=f'reader{i}@example.com', name=f'Reader {i}', is_verified=True)
+            for i in range(2)
+        ]
+
+    def copy_for(self, fanout, subscriber):
+        delivery = StoryDelivery.objects.create(story=self.story, subscriber=subscriber, email=subscriber.email)
+        values = recipient_values(delivery)
+        return fanout.message_for(subscriber.email, values, values['unsubscribe_url']).message().as_bytes()
+
+    def test_personalised_copies(self):
+        fanout = FanoutMessage(*story_email(self.story))
+        self.assertTrue(fanout.intact)
+        first, second = (self.copy_for(fanout, subscriber) for subscriber in self.readers)
+
+        self.assertIn(b'To: reader0@example.com', first)
+        self.assertIn(b'Reader 0', first)
+        self.assertNotIn(b'Reader 1', first)
+        self.assertIn(unsubscribe_url(self.readers[0].id).encode(), first)
+        self.assertNotIn(unsubscribe_url(self.readers[0].id).encode(), second)
+        self.assertIn(b'List-Unsubscribe-Post: List-Unsubscribe=One-Click', second)
+
+
+class DigestScheduleTests(TestCase):
+    """One digest per period, and none for a period with nothing in it"""
+
+    def test_scheduled_once(self):
+        author = User.objects.create(username='author', email='author@example.com')
+        Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED', published_at=timezone.now() - timedelta(hours=2),
+        )
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        digest, started = schedule_digest('DAILY', tomorrow)
+        self.assertTrue(started)
+        self.assertEqual(digest.notify_cursor, None)
+        self.assertEqual(Digest.objects.get(id=digest.id).notify_cursor, 0)
+        self.assertEqual(schedule_digest('DAILY', tomorrow), (digest, False))
+
+    def test_empty_period_not_sent(self):
+        digest, started = schedule_digest('WEEKLY', timezone.localdate() - timedelta(days=30))
+        self.assertFalse(started)
+        self.assertIsNone(Digest.objects.get(id=digest.id).notify_cursor)
+
+
+class DomainThrottleTests(TestCase):
+    """A domain's backoff doubles on each deferral up to the cap and resets on success"""
+
+    @override_settings(EMAIL_DOMAIN_BACKOFF=60, EMAIL_DOMAIN_MAX_BACKOFF=200)
+    def test_backoff_doubles_to_cap(self):
+        throttle = DomainThrottle(0)
+        backoffs = []
+        for _ in range(4):
+            throttle.defer()
+            backoffs.append(throttle.backoff)
+            throttle.resume_at = 0
+        self.assertEqual(backoffs, [60, 120, 200, 200])
+        throttle.succeeded()
+        self.assertEqual(throttle.backoff, 0)
+
+
+class SuppressionTests(TestCase):
+    """Repeated failures suppress an address, a delivery resets the streak, and fan-outs skip it"""
+
+    def test_failure_streak(self):
+        for _ in range(settings.EMAIL_SUPPRESS_AFTER_FAILURES - 1):
+            record_soft_failure('Reader@Example.com', 450, 'Mailbox full')
+        self.assertFalse(is_suppressed('reader@example.com'))
+        clear_soft_failures(['reader@example.com'])
+        record_soft_failure('reader@example.com', 450, 'Mailbox full')
+        self.assertFalse(is_suppressed('reader@example.com'))
+
+        for _ in range(settings.EMAIL_SUPPRESS_AFTER_FAILURES):
+            record_soft_failure('reader@example.com', 450, 'Mailbox full')
+        self.assertTrue(is_suppressed('reader@example.com'))
+
+    def test_fanout_skips_suppressed(self):
+        author = User.objects.create(username='author', email='author@example.com')
+        story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        Subscriber.objects.create(email='reader@example.com', is_verified=True)
+        Subscriber.objects.create(email='bounced@example.com', is_verified=True)
+        record_bounce('bounced@example.com', 550, 'No such user')
+        self.assertEqual(list(story_recipients(story).values_list('email', flat=True)), ['reader@example.com'])
+
+
+class ShardTests(TestCase):
+    """Shards split a story's recipients without gaps or overlap and can be re-run"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        for i in range(10):
+            Subscriber.objects.create(email=f'reader{i}@example.com', is_verified=True)
+
+    def test_ranges_cover_every_recipient_once(self):
+        ranges = shard_ranges(self.story, 3)
+        self.assertEqual(len(ranges), 3)
+        for (_, high), (low, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(high, low)
+        for low, high in ranges:
+            self.assertGreater(expand_shard(self.story, low, high, chunk_size=2), 0)
+        self.assertEqual(StoryDelivery.objects.filter(story=self.story).count(), 10)
+
+        low, high = ranges[0]
+        self.assertEqual(expand_shard(self.story, low, high), 0)
+
+
+class StoryAudienceTests(TestCase):
+    """A story goes to subscribers who follow its category or follow none"""
+
+    def test_category_followers(self):
+        author = User.objects.create(username='author', email='author@example.com')
+        health, water = Category.objects.create(name='Health'), Category.objects.create(name='Water')
+        story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, category=health, status='PUBLISHED',
+        )
+        for email, category in (('health@example.com', health), ('water@example.com', water)):
+            subscriber = Subscriber.objects.create(email=email, is_verified=True)
+            SubscriberCategory.objects.create(subscriber=subscriber, category=category)
+        Subscriber.objects.create(email='all@example.com', is_verified=True)
+        Subscriber.objects.create(email='weekly@example.com', is_verified=True, delivery_mode='WEEKLY')
+
+        recipients = set(story_recipients(story).values_list('email', flat=True))
+        self.assertEqual(recipients, {'health@example.com', 'all@example.com'})
+
+
+@override_settings(TIME_ZONE='UTC', EMAIL_SEND_WINDOW=(22, 6), EMAIL_SEND_WINDOW_RATE=100, EMAIL_SEND_WINDOW_BURST=10)
+class SendWindowTests(TestCase):
+    """Large fan-outs are paced inside the overnight send window, which wraps midnight"""
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime(2030, 1, day, hour, minute))
+
+    def test_burst_goes_now(self):
+        self.assertIsNone(spread_send_time(self.at(1, 12), 9))
+
+    def test_paced_into_tonights_window(self):
+        self.assertEqual(spread_send_time(self.at(1, 12), 10), self.at(1, 22))
+        self.assertEqual(spread_send_time(self.at(1, 12), 60), self.at(1, 22, 30))
+        # Past midnight, still inside the window that opened at 22:00
+        self.assertEqual(spread_send_time(self.at(1, 12), 310), self.at(2, 1))
+
+    def test_overflow_continues_next_night(self):
+        # 8 hours at 100/hour fill one window; the next row waits for the next one
+        self.assertEqual(spread_send_time(self.at(1, 12), 810), self.at(2, 22))
+
+    def test_started_inside_window(self):
+        self.assertEqual(spread_send_time(self.at(2, 5, 30), 110), self.at(2, 22, 30))
+
+    def test_due_stories_published_once(self):
+        author = User.objects.create(username='author', email='author@example.com')
+        due = Story.objects.create(
+            headline='Due', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='SCHEDULED', publish_at=timezone.now() - timedelta(minutes=1),
+        )
+        Story.objects.create(
+            headline='Later', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='SCHEDULED', publish_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(publish_due_stories(), [due.id])
+        self.assertEqual(publish_due_stories(), [])
+        due.refresh_from_db()
+        self.assertEqual((due.status, due.notify_cursor), ('PUBLISHED', 0))
+
+
+class RenderedStoryEmailTests(TestCase):
+    """A story's email is rendered once and again only when what it shows changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        cls.story = Story.objects.create(
+            headline='Clean water', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+
+    def test_rendered_once(self):
+        story_email(self.story)
+        with mock.patch('publisher.utils.story_email_utils.render_story_email') as render:
+            story_email(self.story)
+        render.assert_not_called()
+
+    def test_edit_renders_afresh(self):
+        story_email(self.story)
+        self.story.headline = 'Clean water for all'
+        self.assertEqual(story_email(self.story)[0], 'New Story: Clean water for all')
+        self.assertEqual(RenderedStoryEmail.objects.get(story=self.story).subject, 'New Story: Clean water for all')
+
+    def test_invalidate(self):
+        story_email(self.story)
+        invalidate_story_email(self.story.id)
+        self.assertFalse(RenderedStoryEmail.objects.filter(story=self.story).exists())
+
+
+class CursorPaginationTests(TestCase):
+    """Following next_cursor walks every row once; a tampered cursor is refused"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author', email='author@example.com')
+        for i in range(5):
+            Story.objects.create(
+                headline=f'Story {i % 2}', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+                author=author, status='PUBLISHED',
+            )
+
+    def test_walk(self):
+        seen, cursor = [], ''
+        while cursor is not None:
+            response = self.client.get(reverse('stories'), {'cursor': cursor, 'page_size': 2, 'sort_by': 'headline'})
+            seen += [story['id'] for story in response.json()['stories']]
+            cursor = response.json()['next_cursor']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_bad_cursor(self):
+        response = self.client.get(reverse('stories'), {'cursor': 'forged'})
+        self.assertEqual(response.status_code, 400)
+        cursor = self.client.get(reverse('stories'), {'cursor': '', 'page_size': 2}).json()['next_cursor']
+        response = self.client.get(reverse('stories'), {'cursor': cursor, 'sort_by': 'headline'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PruningTests(TestCase):
+    """Dormant subscribers get one re-engagement email and are deactivated if they ignore it"""
+
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(days=settings.EMAIL_ENGAGED_DAYS + 1)
+        self.dormant = Subscriber.objects.create(email='dormant@example.com', is_verified=True)
+        self.reader = Subscriber.objects.create(email='reader@example.com', is_verified=True)
+        Subscriber.objects.update(subscribed_at=long_ago)
+        Subscriber.objects.filter(pk=self.reader.pk).update(last_engaged_at=timezone.now())
+
+    def test_prune_after_grace(self):
+        self.assertEqual(queue_reengagement(), 1)
+        self.assertEqual(queue_reengagement(), 0)
+        later = timezone.now() + timedelta(days=settings.EMAIL_REENGAGEMENT_GRACE_DAYS + 1)
+        self.assertEqual(prune_unresponsive(later), 1)
+        self.dormant.refresh_from_db()
+        self.assertFalse(self.dormant.is_active)
+
+    def test_answer_keeps_subscriber(self):
+        queue_reengagement()
+        keep_subscribed(self.dormant.id)
+        later = timezone.now() + timedelta(days=settings.EMAIL_REENGAGEMENT_GRACE_DAYS + 1)
+        self.assertEqual(prune_unresponsive(later), 0)
+
+    def test_reengagement_mail_goes_last(self):
+        queue_reengagement()
+        author = User.objects.create(username='author', email='author@example.com')
+        story = Story.objects.create(
+            headline='Story', snippet='Snippet', content='<p>Body</p>', read_time='3 min',
+            author=author, status='PUBLISHED',
+        )
+        StoryDelivery.objects.create(story=story, subscriber=self.reader, email=self.reader.email)
+        queue_mail('Password reset code', 'Body', ['user@example.com'])
+
+        batch = claim_batch(2)
+        self.assertEqual([type(row) for row in batch], [TransactionalEmail, StoryDelivery])
+        self.assertEqual([type(row) for row in claim_batch(2)], [ReengagementEmail])
@@ -38,7 +38,11 @@ urlpatterns = [
     
     # ==================== SUBSCRIPTIONS ====================
     path('subscribers/', views.subscriber_list, name='subscriber_list'),
-    path('unsubscribe/<str:email>/', views.unsubscribe_link, name='unsubscribe'),
+
+    
+    # ==================== EMAIL TRACKING ====================
+    path('track/open/<str:token>/', views.track_open, name='track_open'),
+    path('track/click/<str:token>/<int:story_id>/', views.track_click, name='track_click'),
 
 
     path('privacy-terms/', views.privacy_terms_page, name='privacy_terms_page'),
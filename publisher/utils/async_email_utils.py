@@ -0,0 +1,303 @@
+# utils/async_email_utils.py
+import asyncio
+import base64
+import hmac
+import re
+import smtplib
+import ssl
+import threading
+
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+
+from publisher.utils.email_utils import SenderPool, is_transaction_reject
+
+
+class AsyncSMTPSender:
+    """
+    One SMTP session on an asyncio stream, reused for every message and
+    recycled after EMAIL_MESSAGES_PER_CONNECTION like BatchedSender.
+    STARTTLS and AUTH follow the EHLO extensions, with the AUTH mechanism
+    chosen the way smtplib does (CRAM-MD5, then PLAIN, then LOGIN).
+    Errors are raised as the smtplib exceptions Django's backend raises,
+    so smtp_code() and is_temporary() treat both engines alike.
+    """
+
+    def __init__(self, max_per_connection=None):
+        self.host = settings.EMAIL_HOST
+        self.port = settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER
+        self.password = settings.EMAIL_HOST_PASSWORD
+        self.use_tls = settings.EMAIL_USE_TLS
+        self.use_ssl = settings.EMAIL_USE_SSL
+        self.timeout = settings.EMAIL_TIMEOUT or 30
+        self.max_per_connection = max_per_connection or settings.EMAIL_MESSAGES_PER_CONNECTION
+        self.reader = self.writer = None
+        self.sent_on_connection = 0
+        self.connections_opened = 0
+
+    async def reply(self):
+        """Read one (possibly multi-line) reply. Returns (code, text)."""
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip())
+            if line[3:4] != b'-':
+                return int(line[:3]), b'\n'.join(lines)
+
+    async def command(self, line, expect=(250,)):
+        self.writer.write(line.encode() + b"\r\n")
+        await self.writer.drain()
+        code, text = await self.reply()
+        if code not in expect:
+            raise smtplib.SMTPResponseException(code, text)
+        return code, text
+
+    async def open(self):
+        if self.writer is not None:
+            return
+        context = ssl.create_default_context() if (self.use_ssl or self.use_tls) else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context if self.use_ssl else None),
+            self.timeout,
+        )
+        self.connections_opened += 1
+        self.sent_on_connection = 0
+
+        code, text = await self.reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, text)
+        features = await self.hello()
+        if self.use_tls:
+            if 'STARTTLS' not in features:
+                raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+            await self.command("STARTTLS", expect=(220,))
+            await self.start_tls(context)
+            features = await self.hello()
+        if self.username and self.password:
+            await self.login(features)
+
+    async def hello(self):
+        """
+        EHLO (HELO if the server does not speak ESMTP). Returns the
+        advertised extensions as {name: parameters}, e.g. {'AUTH': 'PLAIN LOGIN'}.
+        """
+        try:
+            _, text = await self.command(f"EHLO {DNS_NAME}")
+        except smtplib.SMTPResponseException:
+            try:
+                await self.command(f"HELO {DNS_NAME}")
+            except smtplib.SMTPResponseException as e:
+                raise smtplib.SMTPHeloError(e.smtp_code, e.smtp_error)
+            return {}
+
+        features = {}
+        for line in text.decode('latin-1').split('\n')[1:]:
+            # Some servers still advertise the pre-RFC "AUTH=PLAIN LOGIN" form
+            match = re.match(r'(?P<name>[A-Za-z0-9][A-Za-z0-9-]*)[ =]?(?P<params>.*)', line.strip())
+            if match:
+                name = match.group('name').upper()
+                features[name] = (features.get(name, '') + ' ' + match.group('params')).strip()
+        return features
+
+    async def login(self, features):
+        """AUTH with the first mechanism both sides support, in smtplib's order of preference"""
+        if 'AUTH' not in features:
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        advertised = features['AUTH'].upper().split()
+        for mechanism in ('CRAM-MD5', 'PLAIN', 'LOGIN'):
+            if mechanism in advertised:
+                break
+        else:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+
+        try:
+            if mechanism == 'CRAM-MD5':
+                _, challenge = await self.command("AUTH CRAM-MD5", expect=(334,))
+                digest = hmac.HMAC(self.password.encode(), base64.b64decode(challenge), 'md5').hexdigest()
+                await self.command(self.b64(f"{self.username} {digest}"), expect=(235,))
+            elif mechanism == 'PLAIN':
+                token = self.b64(f"\0{self.username}\0{self.password}")
+                await self.command(f"AUTH PLAIN {token}", expect=(235,))
+            else:
+                await self.command("AUTH LOGIN", expect=(334,))
+                await self.command(self.b64(self.username), expect=(334,))
+                await self.command(self.b64(self.password), expect=(235,))
+        except smtplib.SMTPResponseException as e:
+            raise smtplib.SMTPAuthenticationError(e.smtp_code, e.smtp_error)
+
+    @staticmethod
+    def b64(value):
+        return base64.b64encode(value.encode()).decode()
+
+    async def start_tls(self, context):
+        if hasattr(self.writer, 'start_tls'):  # Python 3.11+
+            await self.writer.start_tls(context, server_hostname=self.host)
+            return
+        # Python 3.10: upgrade the transport and put fresh streams on top of it
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        transport = await loop.start_tls(self.writer.transport, protocol, context, server_hostname=self.host)
+        protocol.connection_made(transport)
+        self.reader = reader
+        self.writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    async def close(self):
+        if self.writer is None:
+            return
+        writer, self.reader, self.writer = self.writer, None, None
+        try:
+            writer.write(b"QUIT\r\n")
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    async def transaction(self, message):
+        from_email = sanitize_address(message.from_email, message.encoding or settings.DEFAULT_CHARSET)
+        recipients = [
+            sanitize_address(address, message.encoding or settings.DEFAULT_CHARSET)
+            for address in message.recipients()
+        ]
+        data = message.message().as_bytes(linesep='\r\n')
+
+        try:
+            await self.command(f"MAIL FROM:<{from_email}>")
+        except smtplib.SMTPResponseException as e:
+            raise smtplib.SMTPSenderRefused(e.smtp_code, e.smtp_error, from_email)
+        refused = {}
+        for recipient in recipients:
+            try:
+                await self.command(f"RCPT TO:<{recipient}>", expect=(250, 251))
+            except smtplib.SMTPResponseException as e:
+                refused[recipient] = (e.smtp_code, e.smtp_error)
+        if len(refused) == len(recipients):
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        await self.command("DATA", expect=(354,))
+        # Dot-stuff lines starting with '.' and terminate with <CRLF>.<CRLF>
+        data = re.sub(rb'(?m)^\.', b'..', data)
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        self.writer.write(data + b".\r\n")
+        await self.writer.drain()
+        code, text = await self.reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, text)
+
+    async def send(self, message):
+        """Send one message, reconnecting once if the connection was lost"""
+        if self.writer is None:
+            await self.open()
+        elif self.sent_on_connection >= self.max_per_connection:
+            await self.close()
+            await self.open()
+
+        try:
+            await self.transaction(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            await self.close()
+            await self.open()
+            await self.transaction(message)
+
+        self.sent_on_connection += 1
+
+    async def send_message(self, message):
+        """Send one message. Returns None on success, the exception otherwise."""
+        try:
+            await self.send(message)
+            return None
+        except Exception as e:
+            if is_transaction_reject(e):
+                # The server turned down this message, not the session
+                await self.reset()
+            else:
+                # A failed session may be left half-open; start fresh for the next message
+                await self.close()
+            return e
+
+    async def reset(self):
+        """RSET after a rejected message, keeping the session; close it if that fails"""
+        try:
+            await self.command("RSET")
+        except Exception:
+            await self.close()
+
+
+class AsyncSenderPool(SenderPool):
+    """
+    SenderPool on one asyncio event loop instead of one thread per session.
+
+    `concurrency` SMTP sessions (EMAIL_ASYNC_CONCURRENCY) are multiplexed on
+    a loop running in a background thread, so at most that many messages
+    are in flight. Dispatch goes through a bounded queue
+    (EMAIL_ASYNC_QUEUE_SIZE): when it is full, send_messages() blocks until
+    a session frees up. Per-domain throttling, backoff and results are the
+    same as SenderPool's, so send_batch() and the outbox workers use either.
+    """
+
+    def __init__(self, concurrency=None, rate=None, queue_size=None):
+        super().__init__(concurrency or settings.EMAIL_ASYNC_CONCURRENCY, rate)
+        self.queue_size = queue_size or settings.EMAIL_ASYNC_QUEUE_SIZE
+        self.loop = None
+        self.queue = None
+        self.tasks = []
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.threads = [threading.Thread(target=self.loop.run_forever, daemon=True)]
+        self.threads[0].start()
+        self.senders = [AsyncSMTPSender() for _ in range(self.concurrency)]
+        self.run(self._start())
+
+    async def _start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [asyncio.create_task(self._session(sender)) for sender in self.senders]
+
+    def close(self):
+        if self.loop is None:
+            return
+        self.run(self._stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.threads[0].join()
+        self.loop.close()
+        self.loop = None
+        self.threads = []
+
+    async def _stop(self):
+        for _ in self.tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self.tasks)
+
+    def run(self, coroutine):
+        """Run a coroutine on the pool's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _session(self, sender):
+        try:
+            while True:
+                job = await self.queue.get()
+                if job is None:
+                    self.queue.task_done()
+                    break
+                index, message, results = job
+                deferred = self._held_back(message)
+                if deferred is None:
+                    await asyncio.sleep(self.limiter.reserve())
+                    deferred = self._outcome(message, await sender.send_message(message))
+                results[index] = deferred
+                self.queue.task_done()
+        finally:
+            await sender.close()
+
+    def _submit(self, job):
+        # Blocks while the queue is full: backpressure on the dispatcher
+        self.run(self.queue.put(job))
+
+    def _join(self):
+        self.run(self.queue.join())
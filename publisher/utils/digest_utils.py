@@ -0,0 +1,104 @@
+# utils/digest_utils.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from publisher.models import Digest
+from publisher.utils.render_utils import PersonalisedTemplate, email_slots, slot
+from publisher.utils.story_email_utils import story_emails
+
+
+PERIOD_LENGTHS = {
+    'DAILY': timedelta(days=1),
+    'WEEKLY': timedelta(days=7),
+}
+
+
+def digest_period(frequency, end_date=None):
+    """
+    The window a digest covers: the day (or seven days) ending at local
+    midnight at the start of `end_date` (default: today).
+    """
+    end_date = end_date or timezone.localdate()
+    period_end = timezone.make_aware(datetime.combine(end_date, time.min))
+    return period_end - PERIOD_LENGTHS[frequency], period_end
+
+
+def schedule_digest(frequency, end_date=None):
+    """
+    Create the digest for a period and start its fan-out.
+    Returns (digest, started); nothing is sent for an empty or already
+    scheduled period.
+    """
+    period_start, period_end = digest_period(frequency, end_date)
+    digest, created = Digest.objects.get_or_create(
+        frequency=frequency,
+        period_start=period_start,
+        defaults={'period_end': period_end},
+    )
+    if not created or digest.is_empty():
+        return digest, False
+
+    Digest.objects.filter(id=digest.id).update(notify_cursor=0)
+    return digest, True
+
+
+def digest_stories(digest, categories=None):
+    """
+    A digest's stories for a subscriber following `categories` (category
+    ids; empty for everything). Uncategorised stories go to everyone, as
+    they do for immediate notifications.
+    """
+    stories = digest.stories()
+    if categories:
+        stories = stories.filter(Q(category__isnull=True) | Q(category_id__in=categories))
+    return stories
+
+
+def build_digest_email(digest, vacancies=True, notices=True, categories=None):
+    """
+    Build the subject and the plain text / HTML bodies for a digest, in the
+    same PersonalisedTemplate form as story_email. Vacancies and
+    notices are left out for subscribers who opted out of them, and
+    stories outside the subscriber's `categories` (see digest_stories).
+    """
+    site_url = settings.SITE_URL
+    stories = list(digest_stories(digest, categories))
+    emails = story_emails(stories)
+    vacancies = list(digest.vacancies()) if vacancies else []
+    notices = list(digest.notices()) if notices else []
+
+    subject = f"Your {digest.get_frequency_display().lower()} NGO News Digest"
+    html_message = PersonalisedTemplate.from_template('emails/digest.html', {
+        'digest': digest,
+        # Each story's entry comes from its rendered email cache
+        'stories': [emails[story.id].digest_html for story in stories],
+        'vacancies': vacancies,
+        'notices': notices,
+        'site_url': site_url,
+    }, slots=email_slots())
+
+    lines = [f"Hello {slot('subscriber_name')},", "", subject, ""]
+    if stories:
+        lines.append("New stories:")
+        story_url = slot('click_url') if settings.EMAIL_TRACKING else f"{site_url}/publisher/story_page/"
+        lines += [f"- {s.headline}: {story_url}{s.id}/" for s in stories]
+        lines.append("")
+    if vacancies:
+        lines.append("New vacancies:")
+        lines += [f"- {v.title} ({v.organization}): {site_url}/vacancy_page/{v.id}/" for v in vacancies]
+        lines.append("")
+    if notices:
+        lines.append("Important notices:")
+        lines += [f"- {n.headline} ({n.organization}): {site_url}/notice_page/{n.id}/" for n in notices]
+        lines.append("")
+    lines += [
+        "Best regards,", "NGO News Digest Team", "",
+        f"Manage your preferences: {slot('preferences_url')}",
+        f"Unsubscribe: {slot('unsubscribe_url')}",
+    ]
+    plain_message = PersonalisedTemplate("\n".join(lines))
+
+    return subject, plain_message, html_message
@@ -0,0 +1,440 @@
+# utils/email_utils.py
+import asyncio
+import queue
+import smtplib
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+
+def smtp_code(error):
+    """SMTP reply code for a send result (250 for success, None if unknown)"""
+    if error is None:
+        return 250
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return codes[0] if codes else None
+    return getattr(error, 'smtp_code', None)
+
+
+def is_temporary(error):
+    """True for 4xx replies: the server asked us to come back later"""
+    code = smtp_code(error)
+    return code is not None and 400 <= code < 500
+
+
+def is_permanent(error):
+    """True for 5xx replies: the server will not accept this mail as it is"""
+    code = smtp_code(error)
+    return code is not None and 500 <= code < 600
+
+
+def is_recipient_refusal(error):
+    """
+    True when the server turned down the recipient at RCPT TO. Anything
+    else (connect, EHLO, AUTH, MAIL FROM, DATA) is a problem with the
+    session, our sender or the content, not with the address.
+    """
+    return isinstance(error, smtplib.SMTPRecipientsRefused)
+
+
+def is_session_error(error):
+    """
+    True for failures of the SMTP session itself (connect, EHLO, AUTH,
+    MAIL FROM, a dropped or refused connection) rather than of one message
+    """
+    if isinstance(error, (
+        smtplib.SMTPConnectError,
+        smtplib.SMTPHeloError,
+        smtplib.SMTPAuthenticationError,
+        smtplib.SMTPNotSupportedError,
+        smtplib.SMTPSenderRefused,
+        smtplib.SMTPServerDisconnected,
+        asyncio.TimeoutError,
+    )):
+        return True
+    # Socket-level trouble (refused, unreachable, TLS handshake); every
+    # smtplib error is an OSError too, so those are excluded here
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def is_transaction_reject(error):
+    """
+    True when the server refused one message (MAIL FROM, RCPT or DATA)
+    over a session that is still open and can send the next one
+    """
+    return isinstance(error, (
+        smtplib.SMTPSenderRefused,
+        smtplib.SMTPRecipientsRefused,
+        smtplib.SMTPDataError,
+    )) and not is_closing(error)
+
+
+def is_closing(error):
+    """True for 421: the server is shutting the session down and wants us back later"""
+    return smtp_code(error) == 421
+
+
+def is_bounce(error):
+    """True for a 5xx refusal of the recipient: the address will never accept mail"""
+    return is_recipient_refusal(error) and is_permanent(error)
+
+
+def recipient_domain(message):
+    return message.to[0].rsplit('@', 1)[-1].lower()
+
+
+class Deferred(Exception):
+    """
+    Result for a message that was not delivered because its destination
+    domain is backing off. Retry after `delay` seconds; not a failure.
+    """
+
+    def __init__(self, domain, delay, error=None):
+        super().__init__(f"{domain} deferred for {delay:.0f}s" + (f": {error}" if error else ""))
+        self.domain = domain
+        self.delay = delay
+        self.error = error
+        self.smtp_code = smtp_code(error) if error else None
+
+
+class BatchedSender:
+    """
+    Push many messages through a single mail backend connection.
+
+    The connection is opened once and reused for every message; it is
+    re-established transparently when the server drops it and recycled
+    after EMAIL_MESSAGES_PER_CONNECTION messages so long sends don't hit
+    per-session limits on the SMTP host.
+    """
+
+    def __init__(self, max_per_connection=None, **connection_kwargs):
+        self.max_per_connection = max_per_connection or settings.EMAIL_MESSAGES_PER_CONNECTION
+        self.connection_kwargs = connection_kwargs
+        self.connection = None
+        self.sent_on_connection = 0
+        self.connections_opened = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False, **self.connection_kwargs)
+            self.connection.open()
+            self.connections_opened += 1
+            self.sent_on_connection = 0
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def send(self, message):
+        """Send one message, reconnecting once if the connection was lost"""
+        if self.connection is None:
+            self.open()
+        elif self.sent_on_connection >= self.max_per_connection:
+            self.reconnect()
+
+        try:
+            self.connection.send_messages([message])
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.reconnect()
+            self.connection.send_messages([message])
+
+        self.sent_on_connection += 1
+
+    def send_messages(self, messages):
+        """
+        Send messages in order over the shared connection.
+        Returns one entry per message: None on success, the exception otherwise.
+        """
+        results = []
+        for message in messages:
+            try:
+                self.send(message)
+                results.append(None)
+            except Exception as e:
+                if is_transaction_reject(e):
+                    # The server turned down this message, not the session
+                    self.reset()
+                else:
+                    # A failed session may be left half-open; start fresh for the next message
+                    self.close()
+                results.append(e)
+        return results
+
+    def reset(self):
+        """RSET after a rejected message, keeping the session; close it if that fails"""
+        smtp = getattr(self.connection, 'connection', None)
+        if smtp is None:
+            return
+        try:
+            smtp.rset()
+        except (smtplib.SMTPException, OSError):
+            self.close()
+
+
+class RateLimiter:
+    """
+    Spread sends evenly so that all threads together stay under `rate`
+    messages per second. A rate of 0 disables the cap.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Claim the next send slot. Returns how many seconds to wait for it."""
+        if not self.interval:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DomainThrottle:
+    """
+    Send rate and backoff state for one destination domain.
+    Shared between the dispatcher and the sender threads.
+    """
+
+    def __init__(self, rate, base_backoff=None, max_backoff=None):
+        self.interval = 1.0 / rate if rate else 0
+        self.base_backoff = base_backoff or settings.EMAIL_DOMAIN_BACKOFF
+        self.max_backoff = max_backoff or settings.EMAIL_DOMAIN_MAX_BACKOFF
+        self.next_slot = 0.0
+        self.backoff = 0
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def backing_off(self, now):
+        return now < self.resume_at
+
+    def ready_at(self):
+        return max(self.next_slot, self.resume_at)
+
+    def take(self, now):
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+    def defer(self):
+        """
+        Record a 421 reply (or a failed session): double the backoff, up to
+        max_backoff. Failures from sessions that were already in flight when
+        the backoff started count once.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.backing_off(now):
+                return
+            self.backoff = min(max(self.backoff * 2, self.base_backoff), self.max_backoff)
+            self.resume_at = now + self.backoff
+
+    def succeeded(self):
+        with self.lock:
+            self.backoff = 0
+
+    def remaining(self, now):
+        return max(self.resume_at - now, 0)
+
+
+def smtp_backend_configured():
+    return settings.EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend'
+
+
+def get_sender_pool(concurrency=None, rate=None, engine=None):
+    """
+    The sender for outbox workers: the asyncio engine (EMAIL_SENDER_ENGINE =
+    'asyncio') when mail goes out over SMTP, otherwise the thread pool, which
+    also works with Django's console, locmem and file backends.
+    """
+    engine = engine or settings.EMAIL_SENDER_ENGINE
+    if engine == 'asyncio' and smtp_backend_configured():
+        from publisher.utils.async_email_utils import AsyncSenderPool
+        return AsyncSenderPool(concurrency, rate)
+    return SenderPool(concurrency, rate)
+
+
+class SenderPool:
+    """
+    Bounded pool of sender threads fed from one shared queue.
+
+    Each thread owns a BatchedSender, so every thread keeps its own SMTP
+    session open for as long as the pool lives. A RateLimiter shared by
+    all threads enforces EMAIL_MAX_SEND_RATE across the whole pool.
+    Threads never touch the database; callers record the results.
+
+    Messages are queued per destination domain and dispatched round-robin,
+    each domain with its own rate (EMAIL_DOMAIN_RATE_LIMITS) and backoff,
+    so one provider deferring us does not hold up everyone else.
+
+    When the relay itself refuses the session (connect, AUTH, MAIL FROM),
+    the rest of the batch is held back and the whole pool backs off
+    (EMAIL_RELAY_BACKOFF, doubling up to EMAIL_RELAY_MAX_BACKOFF) rather
+    than logging in again for every message.
+    """
+
+    def __init__(self, concurrency=None, rate=None):
+        self.concurrency = concurrency or settings.EMAIL_SENDER_CONCURRENCY
+        self.limiter = RateLimiter(settings.EMAIL_MAX_SEND_RATE if rate is None else rate)
+        self.jobs = queue.Queue()
+        self.threads = []
+        self.senders = []
+        self.domains = {}
+        self.relay = DomainThrottle(0, settings.EMAIL_RELAY_BACKOFF, settings.EMAIL_RELAY_MAX_BACKOFF)
+
+    def throttle(self, domain):
+        if domain not in self.domains:
+            rates = settings.EMAIL_DOMAIN_RATE_LIMITS
+            self.domains[domain] = DomainThrottle(rates.get(domain, settings.EMAIL_DOMAIN_DEFAULT_RATE))
+        return self.domains[domain]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def connections_opened(self):
+        return sum(sender.connections_opened for sender in self.senders)
+
+    def start(self):
+        self.senders = []
+        for _ in range(self.concurrency):
+            sender = BatchedSender()
+            thread = threading.Thread(target=self._work, args=(sender,), daemon=True)
+            self.senders.append(sender)
+            self.threads.append(thread)
+            thread.start()
+
+    def close(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _work(self, sender):
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    self.jobs.task_done()
+                    break
+                index, message, results = job
+                deferred = self._held_back(message)
+                if deferred is None:
+                    self.limiter.wait()
+                    deferred = self._outcome(message, sender.send_messages([message])[0])
+                results[index] = deferred
+                self.jobs.task_done()
+        finally:
+            sender.close()
+
+    def relay_wait(self):
+        """Seconds until the relay may be tried again (0 unless a session failed)"""
+        return self.relay.remaining(time.monotonic())
+
+    def _held_back(self, message):
+        """Deferred if the relay or the domain started backing off after this was dispatched"""
+        domain = recipient_domain(message)
+        throttle = self.throttle(domain)
+        now = time.monotonic()
+        if self.relay.backing_off(now):
+            return Deferred(settings.EMAIL_HOST, self.relay.remaining(now))
+        if throttle.backing_off(now):
+            return Deferred(domain, throttle.remaining(now))
+        return None
+
+    def _outcome(self, message, error):
+        """Turn a send result into the pool's result, updating the domain's backoff"""
+        domain = recipient_domain(message)
+        throttle = self.throttle(domain)
+        if is_session_error(error):
+            # Every other message would fail the same way (and a relay that
+            # sees repeated bad logins may lock the account): stop and wait
+            self.relay.defer()
+            return Deferred(settings.EMAIL_HOST, self.relay.backoff, error)
+        self.relay.succeeded()
+        if is_closing(error):
+            # The server is turning sessions away: the whole domain waits.
+            # Other 4xx replies concern one message and are retried on their own.
+            throttle.defer()
+            return Deferred(domain, throttle.backoff, error)
+        if error is None:
+            throttle.succeeded()
+        return error
+
+    def _submit(self, job):
+        self.jobs.put(job)
+
+    def _join(self):
+        self.jobs.join()
+
+    def send_messages(self, messages):
+        """
+        Fan messages out over the pool and wait for all of them.
+        Returns results in the same order and shape as BatchedSender.send_messages;
+        messages held back by a domain in backoff come back as Deferred.
+        """
+        results = [None] * len(messages)
+        queues = OrderedDict()
+        for index, message in enumerate(messages):
+            queues.setdefault(recipient_domain(message), deque()).append(index)
+
+        while queues:
+            now = time.monotonic()
+            if self.relay.backing_off(now):
+                for domain in queues:
+                    for index in queues[domain]:
+                        results[index] = Deferred(settings.EMAIL_HOST, self.relay.remaining(now))
+                break
+
+            dispatched = False
+            for domain in list(queues):
+                throttle = self.throttle(domain)
+                if throttle.backing_off(now):
+                    for index in queues.pop(domain):
+                        results[index] = Deferred(domain, throttle.remaining(now))
+                    continue
+                if throttle.next_slot > now:
+                    continue
+
+                throttle.take(now)
+                index = queues[domain].popleft()
+                self._submit((index, messages[index], results))
+                dispatched = True
+                if not queues[domain]:
+                    del queues[domain]
+
+            if queues and not dispatched:
+                wait = min(self.throttle(domain).ready_at() for domain in queues) - time.monotonic()
+                time.sleep(min(max(wait, 0.001), 1.0))
+
+        self._join()
+        return results
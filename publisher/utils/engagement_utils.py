@@ -0,0 +1,193 @@
+# utils/engagement_utils.py
+import atexit
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from accounts.models import Subscriber
+from publisher.models import ReengagementEmail, StoryDelivery
+from publisher.utils.schedule_utils import spread_send_time
+from publisher.utils.suppression_utils import exclude_suppressed
+from publisher.utils.token_utils import stay_subscribed_url
+
+
+# ==========================================
+# TRACKING HITS
+# ==========================================
+
+class EngagementBuffer:
+    """
+    Opens and clicks collected in memory and written in batches.
+
+    A tracking hit only adds a delivery id to a set; every `flush_every`
+    hits or `flush_interval` seconds the sets are written with one UPDATE
+    per kind, setting opened_at / clicked_at on rows that do not have it
+    yet. Repeat opens of the same email collapse in the set, and the
+    timestamps are those of the flush (at most `flush_interval` late).
+    """
+
+    KINDS = ('opened_at', 'clicked_at')
+
+    def __init__(self, flush_every=None, flush_interval=None):
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.hits = {kind: set() for kind in self.KINDS}
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, delivery_id, clicked=False):
+        with self.lock:
+            # A click proves the email was opened, images or not
+            self.hits['opened_at'].add(delivery_id)
+            if clicked:
+                self.hits['clicked_at'].add(delivery_id)
+            self.pending += 1
+            due = (
+                self.pending >= (self.flush_every or settings.EMAIL_TRACKING_FLUSH_EVERY)
+                or time.monotonic() - self.last_flush >= (self.flush_interval or settings.EMAIL_TRACKING_FLUSH_INTERVAL)
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            hits = self.hits
+            self.hits = {kind: set() for kind in self.KINDS}
+            self.pending = 0
+            self.last_flush = time.monotonic()
+
+        now = timezone.now()
+        for kind, ids in hits.items():
+            if ids:
+                StoryDelivery.objects.filter(id__in=ids, **{f'{kind}__isnull': True}).update(**{kind: now})
+
+
+# One buffer per web process; whatever is left is written on shutdown
+engagement_buffer = EngagementBuffer()
+atexit.register(engagement_buffer.flush)
+
+
+# ==========================================
+# ROLLUP
+# ==========================================
+
+def engaged_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.EMAIL_ENGAGED_DAYS)
+
+
+def engaged(subscribers, now=None):
+    """
+    Subscribers who opened or clicked something within EMAIL_ENGAGED_DAYS,
+    or subscribed too recently to have had the chance
+    """
+    cutoff = engaged_cutoff(now)
+    return subscribers.filter(Q(last_engaged_at__gte=cutoff) | Q(subscribed_at__gte=cutoff))
+
+
+def dormant(subscribers, now=None):
+    """The complement of engaged()"""
+    cutoff = engaged_cutoff(now)
+    return subscribers.filter(
+        Q(last_engaged_at__lt=cutoff) | Q(last_engaged_at__isnull=True),
+        subscribed_at__lt=cutoff,
+    )
+
+
+def rollup_engagement(now=None):
+    """
+    Recompute every active subscriber's last_engaged_at and engagement_score
+    (opens plus clicks over the last EMAIL_ENGAGEMENT_SCORE_DAYS) from their
+    deliveries, in a single UPDATE. last_engaged_at never moves backwards,
+    so a "keep me subscribed" click is not undone. Returns the rows updated.
+    """
+    now = now or timezone.now()
+    deliveries = StoryDelivery.objects.filter(subscriber=OuterRef('pk'), opened_at__isnull=False)
+    last_open = deliveries.order_by('-opened_at').values('opened_at')[:1]
+    score = (
+        deliveries.filter(opened_at__gte=now - timedelta(days=settings.EMAIL_ENGAGEMENT_SCORE_DAYS))
+        .order_by()
+        .values('subscriber')
+        .annotate(score=Count('id') + Count('clicked_at'))
+        .values('score')
+    )
+    return Subscriber.objects.filter(is_active=True).update(
+        last_engaged_at=Greatest(
+            Coalesce(Subquery(last_open), F('last_engaged_at')),
+            Coalesce(F('last_engaged_at'), Subquery(last_open)),
+        ),
+        engagement_score=Coalesce(Subquery(score), Value(0)),
+    )
+
+
+# ==========================================
+# RE-ENGAGEMENT
+# ==========================================
+
+def queue_reengagement(limit=None, now=None):
+    """
+    Queue a "still interested?" email to the next `limit` dormant
+    subscribers who have not had one as ReengagementEmail rows, which the
+    worker sends after transactional mail and story notifications (paced
+    through the send window when one is configured). Returns the number queued.
+    """
+    now = now or timezone.now()
+    limit = limit or settings.EMAIL_REENGAGEMENT_BATCH
+    subscribers = dormant(
+        exclude_suppressed(Subscriber.objects.filter(is_active=True, is_verified=True, reengagement_sent_at__isnull=True)),
+        now,
+    )
+
+    with transaction.atomic():
+        chosen = list(subscribers.order_by('id').values_list('id', 'name', 'email')[:limit])
+        rows = []
+        for position, (subscriber_id, name, email) in enumerate(chosen):
+            context = {
+                'subscriber_name': name or 'Reader',
+                'stay_url': stay_subscribed_url(subscriber_id),
+                'site_url': settings.SITE_URL,
+            }
+            rows.append(ReengagementEmail(
+                subject="Do you still want NGO News Digest?",
+                body=render_to_string('emails/reengagement.txt', context),
+                html_body=render_to_string('emails/reengagement.html', context),
+                from_email=f"NGO News Digest <{settings.DEFAULT_FROM_EMAIL}>",
+                email=email,
+                subscriber_id=subscriber_id,
+                next_attempt_at=spread_send_time(now, position) or now,
+            ))
+        ReengagementEmail.objects.bulk_create(rows)
+        Subscriber.objects.filter(id__in=[row[0] for row in chosen]).update(reengagement_sent_at=now)
+    return len(rows)
+
+
+def keep_subscribed(subscriber_id):
+    """
+    The subscriber answered a re-engagement email: count them as engaged
+    again. Subscribers who have unsubscribed (or been pruned) stay inactive.
+    """
+    return Subscriber.objects.filter(pk=subscriber_id, is_verified=True, is_active=True).update(
+        last_engaged_at=timezone.now(),
+        reengagement_sent_at=None,
+    )
+
+
+def prune_unresponsive(now=None):
+    """
+    Deactivate subscribers who were sent a re-engagement email more than
+    EMAIL_REENGAGEMENT_GRACE_DAYS ago and have not engaged since.
+    Returns the number deactivated.
+    """
+    now = now or timezone.now()
+    return Subscriber.objects.filter(
+        Q(last_engaged_at__isnull=True) | Q(last_engaged_at__lt=F('reengagement_sent_at')),
+        is_active=True,
+        reengagement_sent_at__lt=now - timedelta(days=settings.EMAIL_REENGAGEMENT_GRACE_DAYS),
+    ).update(is_active=False)
@@ -0,0 +1,108 @@
+# utils/mime_utils.py
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.core.mail.message import DNS_NAME, make_msgid, sanitize_address
+from django.utils.html import escape
+
+from publisher.utils.render_utils import PersonalisedTemplate
+
+
+# Headers regenerated for every recipient; everything else is encoded once
+RECIPIENT_HEADERS = (b'to', b'message-id', b'list-unsubscribe')
+
+
+class PreEncodedMIME:
+    """Stand-in for email.message.Message that returns bytes built elsewhere"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        if linesep == '\r\n':
+            return self.data
+        return self.data.replace(b'\r\n', linesep.encode('ascii'))
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.as_bytes(linesep=linesep).decode('utf-8')
+
+    def get_charset(self):
+        return None
+
+
+class PreEncodedEmail(EmailMessage):
+    """An EmailMessage whose MIME bytes were assembled by FanoutMessage"""
+
+    def __init__(self, data, **kwargs):
+        super().__init__(**kwargs)
+        self.data = data
+
+    def message(self):
+        return PreEncodedMIME(self.data)
+
+
+class FanoutMessage:
+    """
+    A multipart story email encoded to MIME once and stamped per recipient.
+
+    The bodies keep their slot markers through encoding (Django emits utf-8
+    text parts as 8bit), so each recipient's copy only needs the To,
+    Message-ID and List-Unsubscribe headers regenerated and the slot values
+    substituted into the already-encoded bytes.
+    """
+
+    def __init__(self, subject, plain_message, html_message, from_email=None):
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=plain_message.marked_text(),
+            from_email=self.from_email,
+            to=['recipient@invalid'],
+        )
+        email.attach_alternative(html_message.marked_text('html_'), "text/html")
+        data = email.message().as_bytes(linesep='\r\n')
+
+        head, body = data.split(b'\r\n\r\n', 1)
+        self.head = b'\r\n'.join(
+            line for line in self._unfold(head)
+            if line.split(b':', 1)[0].lower() not in RECIPIENT_HEADERS
+        )
+        # Pure-ASCII parts come out as 7bit, but substituted values may not be
+        body = body.replace(b'Content-Transfer-Encoding: 7bit', b'Content-Transfer-Encoding: 8bit')
+        self.body = PersonalisedTemplate(body.decode('utf-8'))
+
+        # Values are substituted as raw utf-8, which is only valid in 8bit
+        # parts; quoted-printable (used for very long lines) could also split
+        # a marker. Callers build messages one by one when this is False.
+        expected = set(plain_message.slots) | {'html_' + name for name in html_message.slots}
+        transfer_encoded = b'quoted-printable' in body.lower() or b'base64' in body.lower()
+        self.intact = expected <= set(self.body.slots) and not transfer_encoded
+
+    @staticmethod
+    def _unfold(head):
+        lines = []
+        for line in head.split(b'\r\n'):
+            if line[:1] in (b' ', b'\t') and lines:
+                lines[-1] += b'\r\n' + line
+            else:
+                lines.append(line)
+        return lines
+
+    def message_for(self, to, values, unsubscribe_url=None):
+        """Build the pre-encoded message for one recipient"""
+        body_values = dict(values)
+        for name, value in values.items():
+            body_values['html_' + name] = escape(str(value))
+
+        headers = [
+            self.head,
+            b'To: ' + sanitize_address(to, 'utf-8').encode('utf-8'),
+            b'Message-ID: ' + make_msgid(domain=DNS_NAME).encode('ascii'),
+        ]
+        if unsubscribe_url:
+            headers.append(b'List-Unsubscribe: <' + unsubscribe_url.encode('utf-8') + b'>')
+            # RFC 8058: mailbox providers may POST to the URL to unsubscribe in one click
+            headers.append(b'List-Unsubscribe-Post: List-Unsubscribe=One-Click')
+
+        data = b'\r\n'.join(headers) + b'\r\n\r\n' + self.body.render_bytes(body_values)
+        return PreEncodedEmail(data, from_email=self.from_email, to=[to])
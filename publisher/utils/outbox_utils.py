@@ -0,0 +1,559 @@
+# utils/outbox_utils.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from accounts.models import Subscriber
+from publisher.models import (
+    Digest, QueuedEmail, ReengagementEmail, Story, StoryDelivery, SubscriberCategory, TransactionalEmail,
+)
+from publisher.utils.cache_utils import bump_generation
+from publisher.utils.digest_utils import build_digest_email
+from publisher.utils.email_utils import (
+    Deferred, get_sender_pool, is_bounce, is_permanent, is_recipient_refusal, is_session_error, smtp_code,
+)
+from publisher.utils.engagement_utils import engaged
+from publisher.utils.mime_utils import FanoutMessage
+from publisher.utils.schedule_utils import spread_send_time
+from publisher.utils.story_email_utils import story_email
+from publisher.utils.suppression_utils import (
+    clear_soft_failures,
+    exclude_suppressed,
+    is_suppressed_email,
+    record_bounce,
+    record_soft_failure,
+)
+from publisher.utils.token_utils import click_url, open_pixel_url, preferences_url, unsubscribe_url
+
+
+def recipient_values(delivery):
+    """Per-recipient values for the slots in a story or digest email"""
+    name = delivery.subscriber.name if delivery.subscriber else ''
+    if delivery.subscriber_id:
+        urls = unsubscribe_url(delivery.subscriber_id), preferences_url(delivery.subscriber_id)
+    else:
+        # Subscriber deleted since the row was queued: nothing left to manage
+        urls = (f"{settings.SITE_URL}/subscriptions/unsubscribe/", f"{settings.SITE_URL}/subscriptions/subscribe/")
+    values = {
+        'subscriber_name': name or 'Reader',
+        'unsubscribe_url': urls[0],
+        'preferences_url': urls[1],
+    }
+    if settings.EMAIL_TRACKING:
+        values['open_pixel_url'] = open_pixel_url(delivery.id)
+        values['click_url'] = click_url(delivery.id)
+    return values
+
+
+def iter_recipients(after_id=0, chunk_size=None, queryset=None):
+    """
+    Yield subscribers from `queryset` (default: all active verified ones)
+    as chunks of (id, email) tuples, walking the primary key (id > last
+    seen id) so memory stays flat and every query is an index range scan
+    however long the list grows.
+    """
+    chunk_size = chunk_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    if queryset is None:
+        queryset = Subscriber.objects.filter(is_active=True, is_verified=True)
+    last_id = after_id
+
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'email')[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def story_recipients(story):
+    """
+    Subscribers who want stories as soon as they are published and either
+    follow the story's category or have not picked any categories. Both
+    checks are EXISTS probes on SubscriberCategory's (subscriber, category)
+    index.
+    """
+    subscribers = Subscriber.objects.filter(is_active=True, is_verified=True, delivery_mode='IMMEDIATE')
+    if settings.EMAIL_FANOUT_AUDIENCE == 'engaged':
+        subscribers = engaged(subscribers)
+    if story.category_id:
+        preferences = SubscriberCategory.objects.filter(subscriber=OuterRef('pk'))
+        subscribers = subscribers.filter(
+            ~Exists(preferences) | Exists(preferences.filter(category_id=story.category_id))
+        )
+    return exclude_suppressed(subscribers)
+
+
+def digest_recipients(digest):
+    """
+    Subscribers who chose this digest's frequency and would find something
+    in it: a story in a category they follow (any story when they follow
+    none, or when the digest has uncategorised stories), or vacancies or
+    notices they have not opted out of.
+    """
+    subscribers = Subscriber.objects.filter(is_active=True, is_verified=True, delivery_mode=digest.frequency)
+    if settings.EMAIL_FANOUT_AUDIENCE == 'engaged':
+        subscribers = engaged(subscribers)
+
+    stories = digest.stories()
+    if not stories.filter(category__isnull=True).exists():
+        wanted = []
+        if stories.exists():
+            preferences = SubscriberCategory.objects.filter(subscriber=OuterRef('pk'))
+            wanted.append(
+                ~Exists(preferences) | Exists(preferences.filter(category_id__in=stories.values('category_id')))
+            )
+        if digest.vacancies().exists():
+            wanted.append(Q(receive_vacancies=True))
+        if digest.notices().exists():
+            wanted.append(Q(receive_notices=True))
+        if not wanted:
+            return subscribers.none()
+        condition = wanted[0]
+        for other in wanted[1:]:
+            condition |= other
+        subscribers = subscribers.filter(condition)
+    return exclude_suppressed(subscribers)
+
+
+def start_story_notifications(story_id):
+    """
+    Mark a story for fan-out. The send_outbox worker expands it into
+    outbox rows chunk by chunk, starting from the first subscriber.
+    """
+    return Story.objects.filter(id=story_id).update(notify_cursor=0)
+
+
+def stop_story_notifications(story_id):
+    """
+    Halt a story's fan-out when it is unpublished: stop expanding it and
+    drop the rows still waiting to go out, so republishing the story
+    queues those subscribers again. Returns the number of rows dropped.
+    """
+    with transaction.atomic():
+        Story.objects.filter(id=story_id).update(notify_cursor=None)
+        dropped, _ = StoryDelivery.objects.filter(story_id=story_id, status='PENDING').delete()
+    return dropped
+
+
+def publish_due_stories(now=None):
+    """
+    Publish every SCHEDULED story whose publish_at has passed and start
+    its notifications. Each story flips with a conditional UPDATE, so two
+    schedulers running at once never publish (or notify) twice.
+    Returns the ids published.
+    """
+    now = now or timezone.now()
+    published = []
+    due = Story.objects.filter(status='SCHEDULED', publish_at__lte=now).values_list('id', 'publish_at')
+    for story_id, publish_at in due:
+        if Story.objects.filter(id=story_id, status='SCHEDULED').update(status='PUBLISHED', published_at=publish_at):
+            # update() sends no post_save, so retire the cached list pages here
+            bump_generation(Story)
+            start_story_notifications(story_id)
+            published.append(story_id)
+    return published
+
+
+def spread_rows(rows, field, object_id):
+    """
+    Give a chunk of new outbox rows their slots in the send window (see
+    spread_send_time). Positions and the anchor come from the rows already
+    queued for the story or digest, so every chunk continues the same pace.
+    """
+    queued = StoryDelivery.objects.filter(**{field: object_id})
+    anchor = queued.order_by('id').values_list('created_at', flat=True).first() or timezone.now()
+    position = queued.count()
+    for offset, row in enumerate(rows):
+        send_at = spread_send_time(anchor, position + offset)
+        if send_at:
+            row.next_attempt_at = send_at
+
+
+def expand_fanout(model, object_id, chunk_size=None):
+    """
+    Queue the next chunk of recipients for a Story or Digest and advance
+    its checkpoint in the same transaction, so an interrupted fan-out
+    resumes after the last subscriber queued. Returns the number of rows queued.
+
+    Subscribers who already have a delivery row for this source are
+    skipped, so a republished story only reaches people it never reached;
+    the unique (story, subscriber) constraint backs this up.
+    """
+    field = 'story' if model is Story else 'digest'
+    recipients = story_recipients if model is Story else digest_recipients
+
+    with transaction.atomic():
+        source = model.objects.select_for_update().filter(id=object_id).first()
+        if source is None or source.notify_cursor is None:
+            return 0
+        if model is Story and source.status != 'PUBLISHED':
+            # Unpublished while the fan-out was under way
+            model.objects.filter(id=object_id).update(notify_cursor=None)
+            return 0
+
+        already_queued = StoryDelivery.objects.filter(**{field: object_id}, subscriber=OuterRef('pk'))
+        queryset = recipients(source).filter(~Exists(already_queued))
+        chunk = next(iter_recipients(source.notify_cursor, chunk_size, queryset), [])
+        if not chunk:
+            model.objects.filter(id=object_id).update(notify_cursor=None)
+            return 0
+
+        rows = [
+            StoryDelivery(**{f'{field}_id': object_id}, subscriber_id=subscriber_id, email=email)
+            for subscriber_id, email in chunk
+        ]
+        if settings.EMAIL_SEND_WINDOW:
+            spread_rows(rows, field, object_id)
+        StoryDelivery.objects.bulk_create(rows, ignore_conflicts=True)
+        model.objects.filter(id=object_id).update(notify_cursor=chunk[-1][0])
+        return len(chunk)
+
+
+def expand_pending_notifications(chunk_size=None):
+    """Queue one chunk for every story and digest with a fan-out in progress"""
+    queued = 0
+    for model in (Story, Digest):
+        pending = model.objects.filter(notify_cursor__isnull=False).values_list('id', flat=True)
+        queued += sum(expand_fanout(model, object_id, chunk_size) for object_id in pending)
+    return queued
+
+
+def queue_mail(subject, message, recipient_list, from_email=None, html_message=None):
+    """
+    Drop-in replacement for send_mail() inside a request: queue one
+    TransactionalEmail per recipient and return immediately. The
+    send_outbox worker delivers them (ahead of story notifications)
+    and retries failures. Returns the number of emails queued.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    TransactionalEmail.objects.bulk_create([
+        TransactionalEmail(
+            subject=subject,
+            body=message,
+            html_body=html_message or '',
+            from_email=from_email,
+            email=email,
+        )
+        for email in recipient_list
+    ])
+    return len(recipient_list)
+
+
+# Claimed in this order: one-off mail a user is waiting for goes first,
+# bulk re-engagement mail last
+OUTBOX_MODELS = [TransactionalEmail, StoryDelivery, ReengagementEmail]
+
+
+def release_stale_claims():
+    """
+    Put rows claimed by a worker that died mid-batch back in the queue
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+    return sum(
+        model.objects.filter(
+            status='SENDING',
+            claimed_at__lt=cutoff
+        ).update(status='PENDING', claimed_at=None)
+        for model in OUTBOX_MODELS
+    )
+
+
+def skip_unsubscribed(model, ids):
+    """
+    Mark the subscriber mail rows among `ids` whose subscriber unsubscribed
+    or whose address was suppressed after the row was queued (a send window
+    can queue a fan-out hours ahead) as SKIPPED. Returns the ids still to send.
+    """
+    unsubscribed = Subscriber.objects.filter(id=OuterRef('subscriber_id'), is_active=False)
+    skipped = set(
+        model.objects.filter(id__in=ids)
+        .filter(Exists(unsubscribed) | is_suppressed_email())
+        .values_list('id', flat=True)
+    )
+    if skipped:
+        model.objects.filter(id__in=skipped).update(status='SKIPPED', claimed_at=None)
+    return [row_id for row_id in ids if row_id not in skipped]
+
+
+def claim_rows(model, batch_size, **filters):
+    """
+    Lock and claim up to batch_size due rows of one outbox model,
+    optionally narrowed by `filters` (e.g. one story's id range).
+    Rows locked by another worker are skipped rather than waited on.
+    Notifications for stories that are no longer published are left
+    alone, and those nobody should receive any more are skipped.
+    """
+    now = timezone.now()
+    due = model.objects.filter(status='PENDING', next_attempt_at__lte=now, **filters)
+    if model is StoryDelivery:
+        published = Story.objects.filter(id=OuterRef('story_id'), status='PUBLISHED')
+        due = due.filter(Q(story_id__isnull=True) | Exists(published))
+
+    with transaction.atomic():
+        ids = []
+        while not ids:
+            ids = list(
+                due.select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return []
+            if model is not TransactionalEmail:
+                ids = skip_unsubscribed(model, ids)
+        model.objects.filter(id__in=ids).update(status='SENDING', claimed_at=now)
+
+    rows = model.objects.filter(id__in=ids).order_by('id')
+    if model is StoryDelivery:
+        rows = rows.select_related('story__author', 'story__category', 'digest', 'subscriber')
+        rows = rows.prefetch_related('subscriber__category_preferences')
+    return list(rows)
+
+
+def claim_batch(batch_size=None):
+    """
+    Claim the next batch of due outbox rows: transactional mail first,
+    then story and digest notifications, then re-engagement mail to fill
+    the rest of the batch.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    batch = []
+    for model in OUTBOX_MODELS:
+        if len(batch) >= batch_size:
+            break
+        batch += claim_rows(model, batch_size - len(batch))
+    return batch
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base delay doubled for every failed attempt"""
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * (2 ** (attempts - 1)))
+
+
+def source_key(delivery):
+    """(model, id) of the Story or Digest a delivery belongs to (None for other queued mail)"""
+    if isinstance(delivery, QueuedEmail):
+        return None
+    if delivery.story_id:
+        return Story, delivery.story_id
+    return Digest, delivery.digest_id
+
+
+def email_key(delivery):
+    """
+    Deliveries with the same key share one rendered email: the story, or
+    the digest plus the recipient's vacancy, notice and category choices.
+    """
+    if delivery.story_id:
+        return Story, delivery.story_id
+    subscriber = delivery.subscriber
+    if subscriber is None:
+        return Digest, delivery.digest_id, True, True, frozenset()
+    categories = frozenset(choice.category_id for choice in subscriber.category_preferences.all())
+    return Digest, delivery.digest_id, subscriber.receive_vacancies, subscriber.receive_notices, categories
+
+
+def build_email(delivery):
+    """Subject and personalisable bodies for whatever a delivery carries"""
+    if delivery.story_id:
+        return story_email(delivery.story)
+    _, _, vacancies, notices, categories = email_key(delivery)
+    return build_digest_email(delivery.digest, vacancies=vacancies, notices=notices, categories=categories)
+
+
+def build_transactional_email(row):
+    """EmailMultiAlternatives for a TransactionalEmail or ReengagementEmail"""
+    email = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=[row.email],
+    )
+    if row.html_body:
+        email.attach_alternative(row.html_body, "text/html")
+    return email
+
+
+class DeliveryRecorder:
+    """
+    Buffer per-recipient outcomes in memory and write them with one
+    bulk_update (plus one F() counter update per story or digest) every
+    EMAIL_DELIVERY_FLUSH_EVERY results instead of one query per message.
+    Failed addresses are fed to the suppression list on the same flush.
+    """
+    FIELDS = [
+        'status', 'attempts', 'smtp_code', 'last_error',
+        'next_attempt_at', 'claimed_at', 'last_attempt_at', 'sent_at',
+    ]
+
+    def __init__(self, flush_every=None):
+        self.flush_every = flush_every or settings.EMAIL_DELIVERY_FLUSH_EVERY
+        self.buffer = []
+        self.totals = {}
+        self.failures = []
+
+    def record(self, delivery, error):
+        """Apply a send result to a delivery row. Returns its new status."""
+        now = timezone.now()
+        delivery.last_attempt_at = now
+        delivery.claimed_at = None
+        delivery.smtp_code = smtp_code(error)
+        counts = {'sent': 0, 'failed': 0}
+        key = source_key(delivery)
+        if key:
+            counts = self.totals.setdefault(key, counts)
+
+        if isinstance(error, Deferred) or is_session_error(error):
+            # The destination domain is closing sessions (421) or the relay
+            # refused our session (connect, AUTH, MAIL FROM) and the sender
+            # pool is backing off: not an attempt against the recipient
+            delay = error.delay if isinstance(error, Deferred) else settings.EMAIL_RELAY_BACKOFF
+            delivery.status = 'PENDING'
+            delivery.next_attempt_at = now + timedelta(seconds=delay)
+            delivery.last_error = str(error)
+        elif error is None:
+            delivery.attempts += 1
+            delivery.status = 'SENT'
+            delivery.sent_at = now
+            delivery.last_error = ''
+            counts['sent'] += 1
+        else:
+            # This message failed: a RCPT refusal, a 4xx for it (e.g. 450/452
+            # mailbox full) or a 5xx for its content (552 too large, 554).
+            # An attempt, retried with backoff up to the cap; a 5xx will not
+            # go away with retries
+            delivery.attempts += 1
+            delivery.last_error = str(error)
+            if is_permanent(error) or delivery.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                delivery.status = 'FAILED'
+                counts['failed'] += 1
+                if is_recipient_refusal(error):
+                    # Only the recipient's own refusals count against the address
+                    self.failures.append((delivery.email, is_bounce(error), delivery.smtp_code, str(error)))
+            else:
+                delivery.status = 'PENDING'
+                delivery.next_attempt_at = now + retry_delay(delivery.attempts)
+
+        self.buffer.append(delivery)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+        return delivery.status
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with transaction.atomic():
+            for model in OUTBOX_MODELS:
+                rows = [row for row in self.buffer if isinstance(row, model)]
+                if rows:
+                    model.objects.bulk_update(rows, self.FIELDS)
+            for (model, object_id), counts in self.totals.items():
+                if counts['sent'] or counts['failed']:
+                    model.objects.filter(id=object_id).update(
+                        sent_count=F('sent_count') + counts['sent'],
+                        failed_count=F('failed_count') + counts['failed'],
+                    )
+            for email, permanent, code, error in self.failures:
+                if permanent:
+                    record_bounce(email, code, error)
+                else:
+                    record_soft_failure(email, code, error)
+            clear_soft_failures(row.email for row in self.buffer if row.status == 'SENT')
+        self.buffer = []
+        self.totals = {}
+        self.failures = []
+
+
+def send_batch(deliveries, sender, recorder=None):
+    """
+    Send a claimed batch through `sender` (a SenderPool or AsyncSenderPool)
+    and record the outcome of every row. Results are buffered in
+    `recorder` when one is given, otherwise written before returning.
+    Returns (sent, failed) totals; rows scheduled for retry count as neither.
+    """
+    emails = {}
+    messages = []
+
+    for delivery in deliveries:
+        if isinstance(delivery, QueuedEmail):
+            messages.append(build_transactional_email(delivery))
+            continue
+
+        key = email_key(delivery)
+        if key not in emails:
+            subject, plain_message, html_message = build_email(delivery)
+            fanout = None
+            if settings.EMAIL_PREENCODED_FANOUT:
+                fanout = FanoutMessage(subject, plain_message, html_message)
+                if not fanout.intact:
+                    fanout = None
+            emails[key] = (subject, plain_message, html_message, fanout)
+        subject, plain_message, html_message, fanout = emails[key]
+
+        values = recipient_values(delivery)
+        if fanout:
+            messages.append(fanout.message_for(delivery.email, values, values['unsubscribe_url']))
+            continue
+
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=plain_message.render(values),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[delivery.email],
+            headers={
+                'List-Unsubscribe': f"<{values['unsubscribe_url']}>",
+                'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+            },
+        )
+        email.attach_alternative(html_message.render(values), "text/html")
+        messages.append(email)
+
+    results = sender.send_messages(messages)
+
+    flush = recorder is None
+    recorder = recorder or DeliveryRecorder()
+
+    sent = failed = 0
+    for delivery, error in zip(deliveries, results):
+        status = recorder.record(delivery, error)
+        if status == 'SENT':
+            sent += 1
+            continue
+        if isinstance(error, Deferred):
+            continue
+        print(f"Failed to send email to {delivery.email}: {error}")
+        if status == 'FAILED':
+            failed += 1
+
+    if flush:
+        recorder.flush()
+    return sent, failed
+
+
+def process_outbox(batch_size=None, sender=None, recorder=None):
+    """
+    Claim and send one batch. Returns the number of rows processed.
+    Pass a long-lived SenderPool to keep SMTP sessions open between batches
+    and a DeliveryRecorder to batch result writes across them.
+    """
+    release_stale_claims()
+    expand_pending_notifications(batch_size)
+    deliveries = claim_batch(batch_size)
+    if not deliveries:
+        return 0
+
+    if sender is None:
+        with get_sender_pool() as pool:
+            sent, failed = send_batch(deliveries, pool, recorder)
+    else:
+        sent, failed = send_batch(deliveries, sender, recorder)
+    print(f"Outbox batch: {len(deliveries)} processed, {sent} sent, {failed} failed")
+    return len(deliveries)
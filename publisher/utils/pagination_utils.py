@@ -0,0 +1,102 @@
+# utils/pagination_utils.py
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+CURSOR_SALT = 'publisher.cursor'
+
+
+class PageError(ValueError):
+    """A page, page_size or sort key a list API does not accept"""
+
+
+class CursorError(PageError):
+    """A cursor or sort key the keyset paginator cannot use"""
+
+
+def page_params(params, sort_keys, default_sort='created_at'):
+    """
+    (page, page_size, sort_by, descending) from a list API's query string.
+
+    Only `sort_keys` may be sorted on: each is backed by a composite index
+    led by the endpoint's base filter, so every ordering is an index scan.
+    page_size is capped at API_MAX_PAGE_SIZE. Raises PageError for an
+    unknown sort key or a page / page_size that is not a positive integer.
+    """
+    sort_by = params.get('sort_by', default_sort)
+    if sort_by not in sort_keys:
+        raise PageError(f"Cannot sort by '{sort_by}'. Available: {', '.join(sort_keys)}")
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', 6))
+    except ValueError:
+        raise PageError("page and page_size must be integers")
+    if page < 1 or page_size < 1:
+        raise PageError("page and page_size must be positive")
+    page_size = min(page_size, settings.API_MAX_PAGE_SIZE)
+    return page, page_size, sort_by, params.get('sort_order', 'asc').lower() == 'desc'
+
+
+def encode_cursor(sort_by, value, last_id):
+    """Opaque, signed token for the position after (value, last_id)"""
+    return signing.dumps([sort_by, str(value), last_id], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, sort_by):
+    """(value, last_id) from a cursor, checked against the requested sort key"""
+    try:
+        cursor_sort, value, last_id = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise CursorError("Invalid cursor")
+    if cursor_sort != sort_by:
+        raise CursorError("Cursor was issued for a different sort order")
+    return value, last_id
+
+
+def keyset_page(queryset, sort_by, descending=False, cursor=None, page_size=6, projection=None):
+    """
+    One page of `queryset` ordered by (sort_by, id), starting after
+    `cursor`. Each page is an index range scan from the last row seen,
+    however deep the client has scrolled, and no COUNT(*) is run; one
+    extra row is fetched to tell whether there is a next page.
+
+    With a `projection` (see projection_utils) the rows are its values()
+    dicts rather than model instances.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises CursorError for a bad cursor or a sort key that is not a
+    non-null field of the model.
+    """
+    try:
+        field = queryset.model._meta.get_field(sort_by)
+    except FieldDoesNotExist:
+        raise CursorError(f"Cannot page by '{sort_by}'")
+    if field.null or not field.concrete:
+        raise CursorError(f"Cannot page by '{sort_by}'")
+
+    direction = 'lt' if descending else 'gt'
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by)
+        try:
+            value = field.to_python(value)
+        except ValidationError:
+            raise CursorError("Invalid cursor")
+        queryset = queryset.filter(
+            Q(**{f'{sort_by}__{direction}': value}) |
+            Q(**{sort_by: value, f'id__{direction}': last_id})
+        )
+
+    if projection is not None:
+        queryset = projection.values(queryset, sort_by)
+
+    prefix = '-' if descending else ''
+    rows = list(queryset.order_by(f'{prefix}{sort_by}', f'{prefix}id')[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    if projection is not None:
+        return rows, encode_cursor(sort_by, last[sort_by], last['id'])
+    return rows, encode_cursor(sort_by, getattr(last, field.attname), last.id)
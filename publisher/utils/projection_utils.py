@@ -0,0 +1,207 @@
+# utils/projection_utils.py
+from django.db.models import Case, TextField, Value, When
+from django.db.models.functions import StrIndex, Substr
+from django.utils.html import strip_tags
+
+from publisher.models import Story
+
+
+class ProjectionError(ValueError):
+    """A fields= request naming keys the projection does not have"""
+
+
+class Projection:
+    """
+    The keys of a JSON list API and the columns each one is built from.
+
+    `fields` maps every key either to an ORM path (joins spelled with __),
+    taken as is, or to a (paths, function) pair whose function builds the
+    value from those columns. A path may also name one of `expressions`,
+    which are computed in the database (e.g. an excerpt of a long column)
+    so only their result is transferred. values() reads exactly the
+    columns needed, joins included, in one query, so a page costs the
+    same number of queries at any size.
+
+    `default` lists the keys returned when the client does not ask for
+    specific ones with fields=; heavy HTML stays out of it.
+    """
+
+    def __init__(self, fields, default=None, expressions=None):
+        self.fields = {
+            key: ((spec,), None) if isinstance(spec, str) else spec
+            for key, spec in fields.items()
+        }
+        self.default = default or list(self.fields)
+        self.expressions = expressions or {}
+
+    def subset(self, keys):
+        """A projection of just `keys`"""
+        return Projection({key: self.fields[key] for key in keys}, expressions=self.expressions)
+
+    def select(self, requested=None):
+        """
+        The projection for a fields= parameter ("headline,image_url"), or
+        the default keys when it is empty. Raises ProjectionError for keys
+        it does not know.
+        """
+        if not requested:
+            return self.subset(self.default)
+        keys = list(dict.fromkeys(key.strip() for key in requested.split(',') if key.strip()))
+        unknown = [key for key in keys if key not in self.fields]
+        if unknown:
+            raise ProjectionError(
+                f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.fields)}"
+            )
+        return self.subset(keys)
+
+    def paths(self):
+        """Every ORM path the projection reads, in order, without repeats"""
+        paths = {'id': None}
+        for columns, _ in self.fields.values():
+            paths.update(dict.fromkeys(columns))
+        return list(paths)
+
+    def values(self, queryset, *extra):
+        """`queryset` as dict rows holding the projection's columns (plus `extra`)"""
+        paths = dict.fromkeys(self.paths() + list(extra))
+        return queryset.values(
+            *[path for path in paths if path not in self.expressions],
+            **{path: self.expressions[path] for path in paths if path in self.expressions},
+        )
+
+    def item(self, row):
+        """The API item for one row from values()"""
+        item = {}
+        for key, (columns, build) in self.fields.items():
+            if build is None:
+                item[key] = row[columns[0]]
+            else:
+                item[key] = build(*(row[column] for column in columns))
+        return item
+
+    def items(self, rows):
+        return [self.item(row) for row in rows]
+
+
+# ==========================================
+# DATABASE-SIDE EXCERPTS
+# ==========================================
+
+def head(column, length):
+    """The first `length` characters of a long text column"""
+    return Substr(column, 1, length, output_field=TextField())
+
+
+def from_first(column, marker, length):
+    """Up to `length` characters of `column` starting at the first `marker`, or ''"""
+    return Case(
+        When(**{f'{column}__contains': marker}, then=Substr(column, StrIndex(column, Value(marker)), length)),
+        default=Value(''),
+        output_field=TextField(),
+    )
+
+
+def plain_excerpt(html, length=150):
+    """Plain text opening of an HTML fragment, ellipsised past `length` characters"""
+    html = html or ''
+    # The fragment may end inside a tag that strip_tags would keep
+    if html.rfind('<') > html.rfind('>'):
+        html = html[:html.rfind('<')]
+    text = ' '.join(strip_tags(html).split())
+    return text[:length] + '...' if len(text) > length else text
+
+
+def full_name(first_name, last_name):
+    return f"{first_name} {last_name}"
+
+
+def story_image_url(thumbnail, content):
+    """
+    Story.get_thumbnail_url() from the columns it reads, without a query;
+    `content` only has to contain the first <img> tag
+    """
+    return Story(thumbnail=thumbnail, content=content).get_thumbnail_url()
+
+
+def story_excerpt(content):
+    return strip_tags(f"{(content or '')[:200]}...")
+
+
+def date_only(moment):
+    return str(moment)[:10]
+
+
+# ==========================================
+# PUBLIC LIST APIS
+# ==========================================
+
+# sort_by keys each list API accepts; every one has a composite index led by
+# the API's base filter (status / is_active), see the models' Meta.indexes
+STORY_SORT_KEYS = ('created_at', 'headline')
+VACANCY_SORT_KEYS = ('created_at', 'application_deadline')
+NOTICE_SORT_KEYS = ('created_at', 'publish_date')
+
+STORY_EXPRESSIONS = {
+    'content_head': head('content', 200),
+    'first_image': from_first('content', '<img', 1000),
+}
+
+STORY_LIST = Projection({
+    'id': 'id',
+    'headline': 'headline',
+    'snippet': 'snippet',
+    'content': 'content',
+    'author': (('author__first_name', 'author__last_name'), full_name),
+    # Authors without a team profile come back as NULL from the LEFT JOIN
+    'author_twitter': (('author__team_profile__twitter_url',), lambda url: url or ''),
+    'author_linkedin': (('author__team_profile__linkedin_url',), lambda url: url or ''),
+    'date_and_time': (('created_at',), date_only),
+    'image_url': (('thumbnail', 'first_image'), story_image_url),
+    'category': 'category__name',
+}, default=[
+    'id', 'headline', 'snippet', 'author', 'author_twitter', 'author_linkedin',
+    'date_and_time', 'image_url', 'category',
+], expressions=STORY_EXPRESSIONS)
+
+# The homepage story widgets
+STORY_CARD = Projection({
+    'id': 'id',
+    'title': 'headline',
+    'snippet': (('content_head',), story_excerpt),
+    'content': 'content',
+    'author': (('author__first_name', 'author__last_name'), full_name),
+    'date_and_time': (('created_at',), date_only),
+    'image_url': (('thumbnail', 'first_image'), story_image_url),
+}, default=['id', 'title', 'snippet', 'author', 'date_and_time', 'image_url'], expressions=STORY_EXPRESSIONS)
+
+VACANCY_LIST = Projection({
+    'id': 'id',
+    'title': 'title',
+    'organization': 'organization',
+    'description': 'description',
+    'excerpt': (('description_head',), plain_excerpt),
+    'location': 'location',
+    'job_type': 'job_type',
+    'application_deadline': 'application_deadline',
+    'expiration_date': 'expiration_date',
+    'created_at': 'created_at',
+}, default=[
+    'id', 'title', 'organization', 'excerpt', 'location', 'job_type',
+    'application_deadline', 'expiration_date', 'created_at',
+], expressions={'description_head': head('description', 600)})
+
+NOTICE_LIST = Projection({
+    'id': 'id',
+    'headline': 'headline',
+    'overview': 'overview',
+    'description': 'description',
+    'excerpt': (('description_head',), plain_excerpt),
+    'organization': 'organization',
+    'category': 'category',
+    'publish_date': 'publish_date',
+    'expiration_date': 'expiration_date',
+    'created_at': 'created_at',
+}, default=[
+    'id', 'headline', 'overview', 'excerpt', 'organization', 'category',
+    'publish_date', 'expiration_date', 'created_at',
+], expressions={'description_head': head('description', 600)})
@@ -0,0 +1,77 @@
+# utils/render_utils.py
+import re
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+
+SLOT_PATTERN = re.compile(r'__nnd_slot_(\w+?)__')
+
+
+def slot(name):
+    """Marker rendered into a template in place of a per-recipient value"""
+    return f'__nnd_slot_{name}__'
+
+
+def email_slots():
+    """Per-recipient slots in story and digest emails"""
+    slots = ['subscriber_name', 'unsubscribe_url', 'preferences_url']
+    if settings.EMAIL_TRACKING:
+        slots += ['open_pixel_url', 'click_url']
+    return slots
+
+
+class PersonalisedTemplate:
+    """
+    A body rendered once with slot markers, filled in per recipient.
+
+    The expensive template render happens a single time; the result is split
+    around its slot markers into pre-encoded literal chunks, so personalising
+    a copy is just a join of those chunks with the recipient's values.
+    """
+
+    def __init__(self, text, escape_values=False):
+        pieces = SLOT_PATTERN.split(text)
+        self.literals = pieces[0::2]
+        self.literal_bytes = [piece.encode('utf-8') for piece in self.literals]
+        self.slots = pieces[1::2]
+        self.escape_values = escape_values
+
+    @classmethod
+    def from_template(cls, template_name, context, slots, escape_values=True):
+        """
+        Render a template once with markers for the given slot names; values
+        are HTML-escaped unless escape_values is False (plain text templates)
+        """
+        context = dict(context)
+        for name in slots:
+            context[name] = slot(name)
+        return cls(render_to_string(template_name, context), escape_values=escape_values)
+
+    def marked_text(self, prefix=''):
+        """The rendered text with its slot markers, optionally renamed with a prefix"""
+        out = [self.literals[0]]
+        for name, literal in zip(self.slots, self.literals[1:]):
+            out.append(slot(prefix + name))
+            out.append(literal)
+        return ''.join(out)
+
+    def _values(self, values):
+        for name in self.slots:
+            value = str(values.get(name, ''))
+            yield escape(value) if self.escape_values else value
+
+    def render(self, values):
+        out = [self.literals[0]]
+        for value, literal in zip(self._values(values), self.literals[1:]):
+            out.append(value)
+            out.append(literal)
+        return ''.join(out)
+
+    def render_bytes(self, values):
+        out = [self.literal_bytes[0]]
+        for value, literal in zip(self._values(values), self.literal_bytes[1:]):
+            out.append(value.encode('utf-8'))
+            out.append(literal)
+        return b''.join(out)
@@ -0,0 +1,51 @@
+# utils/schedule_utils.py
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# ==========================================
+# SEND WINDOW
+# ==========================================
+
+def window_bounds(moment):
+    """
+    (start, end) of the send window containing `moment`, or of the next
+    one if `moment` is outside it. EMAIL_SEND_WINDOW is a pair of local
+    hours and may wrap midnight, e.g. (22, 6).
+    """
+    start_hour, end_hour = settings.EMAIL_SEND_WINDOW
+    moment = timezone.localtime(moment)
+    length = timedelta(hours=(end_hour - start_hour) % 24 or 24)
+
+    # The window that started most recently, then step forward as needed
+    start = timezone.make_aware(datetime.combine(moment.date(), time(start_hour)))
+    if start > moment:
+        start -= timedelta(days=1)
+    if moment >= start + length:
+        start += timedelta(days=1)
+    return start, start + length
+
+
+def spread_send_time(anchor, position):
+    """
+    When the outbox row at `position` (0-based, in queueing order) of a
+    fan-out that started at `anchor` may first be sent.
+
+    The first EMAIL_SEND_WINDOW_BURST rows go immediately; the rest are
+    paced at EMAIL_SEND_WINDOW_RATE per hour inside the EMAIL_SEND_WINDOW,
+    continuing in the next night's window if one is not enough. Returns
+    None when no window is configured.
+    """
+    if not settings.EMAIL_SEND_WINDOW or position < settings.EMAIL_SEND_WINDOW_BURST:
+        return None
+
+    remaining = timedelta(hours=(position - settings.EMAIL_SEND_WINDOW_BURST) / settings.EMAIL_SEND_WINDOW_RATE)
+    start, end = window_bounds(anchor)
+    cursor = max(start, anchor)
+    while cursor + remaining >= end:
+        remaining -= end - cursor
+        start, end = window_bounds(end)
+        cursor = start
+    return cursor + remaining
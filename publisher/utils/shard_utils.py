@@ -0,0 +1,88 @@
+# utils/shard_utils.py
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef
+
+from publisher.models import Story, StoryDelivery
+from publisher.utils.outbox_utils import claim_rows, iter_recipients, send_batch, story_recipients
+
+
+def shard_ranges(story, workers):
+    """
+    Split a story's recipients into `workers` half-open Subscriber.id
+    ranges [low, high) holding roughly the same number of subscribers.
+    """
+    ids = story_recipients(story).order_by('id').values_list('id', flat=True)
+    total = ids.count()
+    if not total:
+        return []
+    workers = max(1, min(workers, total))
+
+    bounds = [ids[total * shard // workers] for shard in range(workers)]
+    bounds.append(ids[total - 1] + 1)
+    return list(zip(bounds, bounds[1:]))
+
+
+def expand_shard(story, low, high, chunk_size=None):
+    """
+    Queue outbox rows for the story's recipients with low <= id < high.
+    Safe to re-run: subscribers who already have a row are skipped.
+    Returns the number of rows queued.
+    """
+    already_queued = StoryDelivery.objects.filter(story=story, subscriber=OuterRef('pk'))
+    queryset = story_recipients(story).filter(~Exists(already_queued), id__lt=high)
+
+    queued = 0
+    for chunk in iter_recipients(low - 1, chunk_size, queryset):
+        StoryDelivery.objects.bulk_create([
+            StoryDelivery(story=story, subscriber_id=subscriber_id, email=email)
+            for subscriber_id, email in chunk
+        ], ignore_conflicts=True)
+        queued += len(chunk)
+    return queued
+
+
+def reclaim_shard(story, low, high):
+    """Put a crashed shard's in-flight rows back in the queue without waiting for the claim timeout"""
+    return StoryDelivery.objects.filter(
+        story=story,
+        subscriber_id__gte=low,
+        subscriber_id__lt=high,
+        status='SENDING',
+    ).update(status='PENDING', claimed_at=None)
+
+
+def send_shard(story, low, high, sender, recorder, batch_size=None):
+    """
+    Send every due outbox row of the story in [low, high) through `sender`.
+    Returns (sent, failed) totals; counters reach the Story row as the
+    recorder flushes.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = failed = 0
+    while True:
+        deliveries = claim_rows(
+            StoryDelivery, batch_size,
+            story=story, subscriber_id__gte=low, subscriber_id__lt=high,
+        )
+        if not deliveries:
+            break
+        batch_sent, batch_failed = send_batch(deliveries, sender, recorder)
+        sent += batch_sent
+        failed += batch_failed
+    recorder.flush()
+    return sent, failed
+
+
+def story_progress(story_id):
+    """Delivery row counts for a story by status"""
+    counts = {status: 0 for status, _ in StoryDelivery.STATUS_CHOICES}
+    for row in StoryDelivery.objects.filter(story_id=story_id).values('status').annotate(n=Count('id')):
+        counts[row['status']] = row['n']
+    return counts
+
+
+def reconcile_counts(story_id):
+    """Rewrite the Story's sent/failed counters from its delivery rows"""
+    counts = story_progress(story_id)
+    Story.objects.filter(id=story_id).update(sent_count=counts['SENT'], failed_count=counts['FAILED'])
+    return counts
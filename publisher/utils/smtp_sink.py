@@ -0,0 +1,145 @@
+# utils/smtp_sink.py
+import random
+import socketserver
+import ssl
+import threading
+import time
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for Django's smtp backend: accepts every message,
+    optionally after a delay, and rejects a configurable share of them.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connection_opened()
+        self.reply("220 localhost NGO News Digest SMTP sink")
+        started = None
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('latin-1').strip().split(' ', 1)[0].upper()
+
+            if command == 'EHLO':
+                self.reply("250-localhost")
+                if sink.tls_context:
+                    self.reply("250-STARTTLS")
+                self.reply("250 8BITMIME")
+            elif command == 'STARTTLS' and sink.tls_context:
+                self.reply("220 Ready to start TLS")
+                self.connection = sink.tls_context.wrap_socket(self.connection, server_side=True)
+                self.rfile = self.connection.makefile('rb')
+                self.wfile = self.connection.makefile('wb', buffering=0)
+            elif command == 'HELO':
+                self.reply("250 localhost")
+            elif command == 'MAIL':
+                started = time.perf_counter()
+                self.reply("250 OK")
+            elif command == 'RCPT':
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data in iter(self.rfile.readline, b''):
+                    if data == b".\r\n":
+                        break
+                    size += len(data)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                code = sink.outcome()
+                sink.message_received(size, time.perf_counter() - started, code)
+                self.reply(f"{code} OK" if code == 250 else f"{code} Rejected by sink")
+            elif command in ('RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink:
+    """
+    In-process SMTP server on 127.0.0.1 for benchmarks. Runs in a
+    background thread and records connections, messages and the time
+    each SMTP transaction took (MAIL FROM to the final reply).
+
+    latency      seconds to wait before answering each message
+    failure_rate share of messages answered with failure_code
+    seed         makes the failure pattern reproducible
+    certfile     PEM file with a certificate and key; offers STARTTLS when set
+    """
+
+    def __init__(self, latency=0, failure_rate=0, failure_code=550, seed=None, certfile=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_code = failure_code
+        self.random = random.Random(seed)
+        self.tls_context = None
+        if certfile:
+            self.tls_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.tls_context.load_cert_chain(certfile)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.timings = []
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPSinkHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def outcome(self):
+        with self.lock:
+            failed = self.failure_rate and self.random.random() < self.failure_rate
+        return self.failure_code if failed else 250
+
+    def message_received(self, size, elapsed, code):
+        with self.lock:
+            self.timings.append(elapsed)
+            self.bytes += size
+            if code == 250:
+                self.accepted += 1
+            else:
+                self.rejected += 1
+
+    def percentile(self, p):
+        """p-th percentile of SMTP transaction time in seconds (nearest rank)"""
+        if not self.timings:
+            return 0
+        timings = sorted(self.timings)
+        return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
@@ -0,0 +1,117 @@
+# utils/story_email_utils.py
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.template.loader import get_template, render_to_string
+
+from publisher.models import RenderedStoryEmail
+from publisher.utils.render_utils import PersonalisedTemplate, email_slots, slot
+
+
+# Everything a story's email is rendered from; editing any of these
+# templates changes every story's content hash
+STORY_EMAIL_TEMPLATES = [
+    'emails/new_story.html',
+    'emails/new_story.txt',
+    'emails/partials/digest_story.html',
+]
+
+
+def render_story_email(story):
+    """
+    Build the subject and the plain text / HTML bodies for a story
+    notification. Bodies are PersonalisedTemplates: rendered once here,
+    filled per recipient with recipient_values(). Does not touch the
+    cache; senders should go through story_email().
+    """
+    context = {
+        'post': story,
+        'site_url': settings.SITE_URL,
+    }
+    subject = f"New Story: {story.headline}"
+    html_message = PersonalisedTemplate.from_template('emails/new_story.html', context, email_slots())
+    plain_message = PersonalisedTemplate.from_template('emails/new_story.txt', context, email_slots(), escape_values=False)
+    return subject, plain_message, html_message
+
+
+def render_digest_story(story):
+    """A story's entry in digest emails, with the click_url slot when tracking"""
+    return render_to_string('emails/partials/digest_story.html', {
+        'story': story,
+        'site_url': settings.SITE_URL,
+        'click_url': slot('click_url') if settings.EMAIL_TRACKING else '',
+    })
+
+
+def story_email_hash(story):
+    """
+    Hash of every input the rendered bodies depend on: the story fields
+    the templates show, the settings that change links and slots, and
+    the template sources themselves.
+    """
+    parts = [
+        story.id,
+        story.headline,
+        story.snippet,
+        story.read_time,
+        story.published_at.isoformat() if story.published_at else '',
+        story.author.get_full_name() if story.author_id else '',
+        story.category.name if story.category_id else '',
+        settings.SITE_URL,
+        ','.join(email_slots()),
+    ]
+    parts += [get_template(name).template.source for name in STORY_EMAIL_TEMPLATES]
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def store_story_email(story, content_hash):
+    """Render a story's email and save it as the story's RenderedStoryEmail"""
+    subject, plain_message, html_message = render_story_email(story)
+    fields = {
+        'content_hash': content_hash,
+        'subject': subject,
+        'plain_body': plain_message.marked_text(),
+        'html_body': html_message.marked_text(),
+        'digest_html': render_digest_story(story),
+    }
+    try:
+        with transaction.atomic():
+            row, _ = RenderedStoryEmail.objects.update_or_create(story=story, defaults=fields)
+    except IntegrityError:
+        # Another worker stored the same render first; ours is just as good
+        row = RenderedStoryEmail(story=story, **fields)
+    return row
+
+
+def story_emails(stories):
+    """
+    {story id: RenderedStoryEmail} for `stories`, fetched in one query.
+    Stories with no rendered email, or one whose content hash no longer
+    matches, are rendered and stored on the way.
+    """
+    stories = list(stories)
+    cached = {row.story_id: row for row in RenderedStoryEmail.objects.filter(story__in=stories)}
+    emails = {}
+    for story in stories:
+        content_hash = story_email_hash(story)
+        row = cached.get(story.id)
+        if row is None or row.content_hash != content_hash:
+            row = store_story_email(story, content_hash)
+        emails[story.id] = row
+    return emails
+
+
+def story_email(story):
+    """Subject and personalisable bodies for a story, from the rendered email cache"""
+    row = story_emails([story])[story.id]
+    return (
+        row.subject,
+        PersonalisedTemplate(row.plain_body),
+        PersonalisedTemplate(row.html_body, escape_values=True),
+    )
+
+
+def invalidate_story_email(story_id):
+    """Drop a story's rendered email so the next send, preview or digest renders it afresh"""
+    return RenderedStoryEmail.objects.filter(story_id=story_id).delete()
@@ -0,0 +1,67 @@
+# utils/suppression_utils.py
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+
+from publisher.models import SuppressedEmail
+
+
+def is_suppressed_email():
+    """EXISTS condition: the row's `email` is on the suppression list (SuppressedEmail's unique email index)"""
+    return Exists(SuppressedEmail.objects.filter(email=OuterRef('email'), is_suppressed=True))
+
+
+def exclude_suppressed(queryset):
+    """
+    Drop subscribers whose address is on the suppression list.
+    A NOT EXISTS anti-join on SuppressedEmail's unique email index.
+    """
+    return queryset.filter(~is_suppressed_email())
+
+
+def is_suppressed(email):
+    return SuppressedEmail.objects.filter(email=SuppressedEmail.normalise(email), is_suppressed=True).exists()
+
+
+def record_bounce(email, smtp_code, error):
+    """Suppress an address straight away after a permanent failure"""
+    SuppressedEmail.objects.update_or_create(
+        email=SuppressedEmail.normalise(email),
+        defaults={
+            'is_suppressed': True,
+            'reason': 'BOUNCE',
+            'smtp_code': smtp_code,
+            'last_error': error,
+        },
+    )
+
+
+def record_soft_failure(email, smtp_code, error):
+    """
+    Count a delivery that failed after all its retries. The address is
+    suppressed once it reaches EMAIL_SUPPRESS_AFTER_FAILURES in a row.
+    """
+    email = SuppressedEmail.normalise(email)
+    entry, _ = SuppressedEmail.objects.get_or_create(email=email)
+    SuppressedEmail.objects.filter(id=entry.id).update(
+        failure_count=F('failure_count') + 1,
+        smtp_code=smtp_code,
+        last_error=error,
+    )
+    SuppressedEmail.objects.filter(
+        id=entry.id,
+        is_suppressed=False,
+        failure_count__gte=settings.EMAIL_SUPPRESS_AFTER_FAILURES,
+    ).update(is_suppressed=True, reason='FAILURES')
+
+
+def clear_soft_failures(emails):
+    """A successful delivery resets the failure streak of addresses not yet suppressed"""
+    emails = {SuppressedEmail.normalise(email) for email in emails}
+    if not emails:
+        return 0
+    return SuppressedEmail.objects.filter(email__in=emails, is_suppressed=False).delete()[0]
+
+
+def unsuppress(email):
+    """Remove an address from the list, e.g. once it has confirmed it receives mail"""
+    return SuppressedEmail.objects.filter(email=SuppressedEmail.normalise(email)).delete()[0]
@@ -0,0 +1,80 @@
+# utils/token_utils.py
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+
+UNSUBSCRIBE_SALT = 'subscriptions.unsubscribe'
+PREFERENCES_SALT = 'subscriptions.preferences'
+TRACKING_SALT = 'publisher.tracking'
+REENGAGEMENT_SALT = 'subscriptions.reengagement'
+
+
+def make_subscriber_token(subscriber_id, salt):
+    """
+    Stateless token for a subscriber: their id plus an HMAC of it keyed
+    on SECRET_KEY and `salt`. Nothing is stored; the signature is the proof.
+    """
+    return signing.Signer(salt=salt).sign(str(subscriber_id))
+
+
+def read_subscriber_token(token, salt):
+    """Subscriber id from a token, or None if it was not signed by us with `salt`"""
+    try:
+        return int(signing.Signer(salt=salt).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def make_unsubscribe_token(subscriber_id):
+    return make_subscriber_token(subscriber_id, UNSUBSCRIBE_SALT)
+
+
+def read_unsubscribe_token(token):
+    return read_subscriber_token(token, UNSUBSCRIBE_SALT)
+
+
+def read_preferences_token(token):
+    return read_subscriber_token(token, PREFERENCES_SALT)
+
+
+def unsubscribe_url(subscriber_id):
+    """Absolute one-click unsubscribe URL for the email footer and List-Unsubscribe"""
+    token = make_unsubscribe_token(subscriber_id)
+    return settings.SITE_URL + reverse('one_click_unsubscribe', args=[token])
+
+
+def preferences_url(subscriber_id):
+    """Absolute URL of the subscriber's preferences page"""
+    token = make_subscriber_token(subscriber_id, PREFERENCES_SALT)
+    return settings.SITE_URL + reverse('subscriber_preferences', args=[token])
+
+
+def open_pixel_url(delivery_id):
+    """Absolute URL of the tracking pixel for one delivery"""
+    token = make_subscriber_token(delivery_id, TRACKING_SALT)
+    return settings.SITE_URL + reverse('track_open', args=[token])
+
+
+def click_url(delivery_id):
+    """
+    Absolute click-tracking prefix for one delivery; append a story id
+    and a slash to get a link that records the click and redirects there.
+    """
+    token = make_subscriber_token(delivery_id, TRACKING_SALT)
+    return settings.SITE_URL + reverse('track_click', args=[token, 0])[:-2]
+
+
+def read_tracking_token(token):
+    """Delivery id from an open or click token, or None"""
+    return read_subscriber_token(token, TRACKING_SALT)
+
+
+def stay_subscribed_url(subscriber_id):
+    """Absolute "keep me subscribed" URL for re-engagement emails"""
+    token = make_subscriber_token(subscriber_id, REENGAGEMENT_SALT)
+    return settings.SITE_URL + reverse('stay_subscribed', args=[token])
+
+
+def read_reengagement_token(token):
+    return read_subscriber_token(token, REENGAGEMENT_SALT)
@@ -1,20 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail
 from django.conf import settings
-from django.utils.html import strip_tags
-from django.template.loader import render_to_string
 from django.utils import timezone
 from django.contrib import messages
-import threading
 import json
 
 from datetime import datetime
 
 from .models import Story, Vacancy, Notice, Category
+from .utils.cache_utils import cache_response
+from .utils.engagement_utils import engagement_buffer
+from .utils.outbox_utils import start_story_notifications
+from .utils.pagination_utils import PageError, keyset_page, page_params
+from .utils.projection_utils import (
+    NOTICE_LIST, NOTICE_SORT_KEYS, STORY_CARD, STORY_LIST, STORY_SORT_KEYS, VACANCY_LIST, VACANCY_SORT_KEYS,
+    ProjectionError,
+)
+from .utils.token_utils import read_tracking_token, unsubscribe_url
 
 from accounts.models import Subscriber, SiteInfo, TeamMember
 
@@ -156,80 +162,25 @@ def download_privacy_terms(request):
         # Fallback: redirect to a placeholder or show error
         return redirect('privacy_terms_page')
 
-# ==================== EMAIL UTILITIES ====================
-
-
-import threading
-import time
-from django.db import connection
-
-class EmailThread(threading.Thread):
-    """Background thread for sending emails with better error handling"""
-    def __init__(self, subject, plain_message, html_message, recipient_list, story_id):
-        super().__init__(daemon=True)
-        self.subject = subject
-        self.plain_message = plain_message
-        self.html_message = html_message
-        self.recipient_list = recipient_list
-        self.story_id = story_id
-        self.sent_count = 0
-        self.failed_count = 0
-
-    def run(self):
-        """Send emails in background thread"""
-        # Close any old database connections before starting thread
-        connection.close()
-        
-        for recipient in self.recipient_list:
-            try:
-                email = EmailMultiAlternatives(
-                    subject=self.subject,
-                    body=self.plain_message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[recipient],
-                )
-                if self.html_message:
-                    email.attach_alternative(self.html_message, "text/html")
-                email.send()
-                self.sent_count += 1
-                print(f"Email sent to {recipient}")
-            except Exception as e:
-                self.failed_count += 1
-                print(f"Failed to send email to {recipient}: {e}")
-        
-        print(f"Email summary: {self.sent_count} sent, {self.failed_count} failed")
-        # try:
-        story = Story.objects.get(id=self.story_id)
-        story.success = self.sent_count
-        story.success = self.failed_count
-        story.save()
-        # except:
-        #     pass
-
-        
-        # Close database connection when done
-        connection.close()
-
-
-def send_email_in_background(subject, plain_message, html_message, recipient_list, story_id):
-    """Start email sending in background thread"""
-    if recipient_list:
-        EmailThread(subject, plain_message, html_message, recipient_list, story_id).start()
-        return True
-    return False
-
 # ==================== BLOG POST VIEWS ====================
 
+@cache_response(Story, Category)
 def stories(request):
     """API endpoint for paginated stories"""
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 6))
-    sort_by = request.GET.get('sort_by', 'created_at')
-    sort_order = request.GET.get('sort_order', 'asc')
+    try:
+        page, page_size, sort_by, descending = page_params(request.GET, STORY_SORT_KEYS)
+    except PageError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     search_query = request.GET.get('search', '')
     category_filter = request.GET.get('category', '')
     
-    stories_qs = Story.objects.all()
+    stories_qs = Story.objects.filter(status="PUBLISHED")
+    
+    # Only the requested keys (default: the compact list shape) are selected
+    try:
+        projection = STORY_LIST.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     # Apply search filter
     if search_query:
@@ -245,33 +196,30 @@ def stories(request):
     if category_filter and category_filter.lower() != 'all':
         stories_qs = stories_qs.filter(category__name=category_filter)
     
-    # Apply sorting
-    if sort_order.lower() == 'desc':
-        sort_by = f'-{sort_by}'
-    stories_qs = stories_qs.order_by(sort_by)
+    # Cursor mode: keyset pagination
+    if 'cursor' in request.GET:
+        try:
+            paginated_stories, next_cursor = keyset_page(
+                stories_qs, sort_by, descending, request.GET['cursor'], page_size,
+                projection=projection,
+            )
+        except PageError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        # Apply sorting; id breaks ties so pages do not overlap
+        prefix = '-' if descending else ''
+        stories_qs = stories_qs.order_by(f'{prefix}{sort_by}', f'{prefix}id')
+        
+        # Pagination
+        total_stories = stories_qs.count()
+        start_index = (page - 1) * page_size
+        end_index = start_index + page_size
+        paginated_stories = projection.values(stories_qs)[start_index:end_index]
     
-    # Pagination
-    total_stories = stories_qs.count()
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_stories = stories_qs[start_index:end_index]
+    stories_list = projection.items(paginated_stories)
     
-    stories_list = [
-        {
-            'id': story.id,
-            'headline': story.headline,
-            'snippet': story.snippet,
-            'content': story.content,
-            'author': f"{story.author.first_name} {story.author.last_name}",
-            # For blank fields, check if they exist AND have content
-            'author_twitter': story.author.team_profile.twitter_url if hasattr(story.author, 'team_profile') and story.author.team_profile.twitter_url else '',
-            'author_linkedin': story.author.team_profile.linkedin_url if hasattr(story.author, 'team_profile') and story.author.team_profile.linkedin_url else '',
-            'date_and_time': str(story.created_at)[:10],
-            'image_url': story.get_thumbnail_url(),
-            'category': story.category.name,
-        }
-        for story in paginated_stories
-    ]
+    if 'cursor' in request.GET:
+        return JsonResponse({"stories": stories_list, "next_cursor": next_cursor})
     
     return JsonResponse({
         "stories": stories_list,
@@ -283,108 +231,53 @@ def stories(request):
 
 def get_latest_stories(request):
     """API endpoint for latest published stories"""
-    latest_stories = Story.objects.filter(status="PUBLISHED").order_by('-created_at')[:6]
+    try:
+        projection = STORY_CARD.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    latest_stories_list = [
-        {
-            'id': story.id,
-            'title': story.title,
-            'snippet': strip_tags(f"{story.content[:200]}..."),
-            'content': story.content,
-            'author': f"{story.author.first_name} {story.author.last_name}",
-            'date_and_time': str(story.created_at)[:10],
-            'image_url': story.get_thumbnail_url(),
-        }
-        for story in latest_stories
-    ]
+    latest_stories = projection.values(Story.objects.filter(status="PUBLISHED").order_by('-created_at'))[:6]
+    
+    latest_stories_list = projection.items(latest_stories)
     
     return JsonResponse({"stories": latest_stories_list})
 
 
 def get_top_stories(request):
     """API endpoint for top stories"""
-    top_stories = Story.objects.filter(status="PUBLISHED")[:6]
+    try:
+        projection = STORY_CARD.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    top_stories_list = [
-        {
-            'id': story.id,
-            'title': story.title,
-            'snippet': strip_tags(f"{story.content[:200]}..."),
-            'content': story.content,
-            'author': f"{story.author.first_name} {story.author.last_name}",
-            'date_and_time': str(story.created_at)[:10],
-            'image_url': story.get_thumbnail_url(),
-        }
-        for story in top_stories
-    ]
+    top_stories = projection.values(Story.objects.filter(status="PUBLISHED"))[:6]
+    
+    top_stories_list = projection.items(top_stories)
     
     return JsonResponse({"stories": top_stories_list})
 
 
 def get_editors_pick_stories(request):
     """API endpoint for editors pick stories"""
-    editors_pick_stories = Story.objects.filter(status="PUBLISHED")[:6]
+    try:
+        projection = STORY_CARD.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    editors_pick_stories_list = [
-        {
-            'id': story.id,
-            'title': story.title,
-            'snippet': strip_tags(f"{story.content[:200]}..."),
-            'content': story.content,
-            'author': f"{story.author.first_name} {story.author.last_name}",
-            'date_and_time': str(story.created_at)[:10],
-            'image_url': story.get_thumbnail_url(),
-        }
-        for story in editors_pick_stories
-    ]
+    editors_pick_stories = projection.values(Story.objects.filter(status="PUBLISHED"))[:6]
+    
+    editors_pick_stories_list = projection.items(editors_pick_stories)
     
     return JsonResponse({"stories": editors_pick_stories_list})
 
 
 
 def notify_subscribers(post_id):
-    """Notify subscribers about new post"""
-    try:
-        post = Story.objects.get(id=post_id)
-        site_url = settings.SITE_URL
-        
-        # Get active verified subscribers
-        subscribers = Subscriber.objects.filter(
-            is_active=True, 
-            is_verified=True
-        ).values_list('email', flat=True)
-        
-        if not subscribers.exists():
-            print("No subscribers to notify")
-            return
-        
-        # Create email content - FIXED: using post.headline instead of post.title
-        subject = f"New Story: {post.headline}"
-        html_message = render_to_string('emails/new_story.html', {
-            'post': post,
-            'site_url': site_url,
-        })
-        
-        plain_message = f"""
-        New Story: {post.headline}
-        
-        {post.snippet}
-        
-        Read the full story: {site_url}/publisher/story_page/{post.id}/
-        
-        Best regards,
-        NGO News Digest Team
-        """
-        
-        # Send in background
-        print(f"Starting email thread for {subscribers.count()} subscribers...")
-        send_email_in_background(subject, plain_message, html_message, list(subscribers), post_id)
-        print(f"Email thread started for story: {post.headline}")
-        
-    except Story.DoesNotExist:
+    """Start notifying subscribers about a new post; the send_outbox worker delivers the emails"""
+    if start_story_notifications(post_id):
+        print(f"Notification fan-out started for story {post_id}")
+    else:
         print(f"Post {post_id} not found")
-    except Exception as e:
-        print(f"Error in notify_subscribers: {e}")
 
 
 def success_page(request):
@@ -400,42 +293,45 @@ def success_page(request):
 
 # ==================== VACANCY VIEWS ====================
 
+@cache_response(Vacancy)
 def vacancies(request):
     """API endpoint for paginated stories"""
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 6))
-    sort_by = request.GET.get('sort_by', 'created_at')
-    sort_order = request.GET.get('sort_order', 'asc')
-    
-    vacancies_qs = Vacancy.objects.all()
+    try:
+        page, page_size, sort_by, descending = page_params(request.GET, VACANCY_SORT_KEYS)
+    except PageError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    # Apply sorting
-    if sort_order.lower() == 'desc':
-        sort_by = f'-{sort_by}'
-    vacancies_qs = vacancies_qs.order_by(sort_by)
+    vacancies_qs = Vacancy.objects.filter(is_active=True)
     
-    # Pagination
-    total_vacancies = vacancies_qs.count()
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_vacancies = vacancies_qs[start_index:end_index]
+    # Only the requested keys (default: the compact list shape) are selected
+    try:
+        projection = VACANCY_LIST.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Cursor mode: keyset pagination
+    if 'cursor' in request.GET:
+        try:
+            paginated_vacancies, next_cursor = keyset_page(
+                vacancies_qs, sort_by, descending, request.GET['cursor'], page_size,
+                projection=projection,
+            )
+        except PageError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        # Apply sorting; id breaks ties so pages do not overlap
+        prefix = '-' if descending else ''
+        vacancies_qs = vacancies_qs.order_by(f'{prefix}{sort_by}', f'{prefix}id')
+        
+        # Pagination
+        start_index = (page - 1) * page_size
+        end_index = start_index + page_size
+        paginated_vacancies = projection.values(vacancies_qs)[start_index:end_index]
     
-    vacancies_list = [
-        {
-            'id': vacancy.id,
-            'title': vacancy.title,
-            'organization': vacancy.organization,
-            'description': vacancy.description,
-            'location': vacancy.location,
-            'job_type': vacancy.job_type,
-            'application_deadline': vacancy.application_deadline,
-            'expiration_date': vacancy.expiration_date,
-            'created_at': vacancy.created_at,
-            'organization': vacancy.organization,
-        }
-        for vacancy in paginated_vacancies
-    ]
+    vacancies_list = projection.items(paginated_vacancies)
     
+    if 'cursor' in request.GET:
+        return JsonResponse({"vacancies": vacancies_list, "next_cursor": next_cursor})
     return JsonResponse({"vacancies": vacancies_list})
 
 
@@ -492,6 +388,7 @@ def vacancy_page(request, pk):
     return render(request, 'publisher/vacancy_page.html', context)
 
 
+@cache_response(Vacancy)
 def get_vacancies(request):
     """API for homepage vacancies"""
     # Featured vacancies
@@ -543,40 +440,45 @@ def get_vacancies(request):
 
 # ==================== NOTICE VIEWS ====================
 
+@cache_response(Notice)
 def notices(request):
     """API endpoint for paginated stories"""
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 6))
-    sort_by = request.GET.get('sort_by', 'created_at')
-    sort_order = request.GET.get('sort_order', 'asc')
-    
-    notices_qs = Notice.objects.all()
+    try:
+        page, page_size, sort_by, descending = page_params(request.GET, NOTICE_SORT_KEYS)
+    except PageError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    # Apply sorting
-    if sort_order.lower() == 'desc':
-        sort_by = f'-{sort_by}'
-    notices_qs = notices_qs.order_by(sort_by)
+    notices_qs = Notice.objects.filter(is_active=True)
     
-    # Pagination
-    total_notices = notices_qs.count()
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-    paginated_notices = notices_qs[start_index:end_index]
+    # Only the requested keys (default: the compact list shape) are selected
+    try:
+        projection = NOTICE_LIST.select(request.GET.get('fields'))
+    except ProjectionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Cursor mode: keyset pagination
+    if 'cursor' in request.GET:
+        try:
+            paginated_notices, next_cursor = keyset_page(
+                notices_qs, sort_by, descending, request.GET['cursor'], page_size,
+                projection=projection,
+            )
+        except PageError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        # Apply sorting; id breaks ties so pages do not overlap
+        prefix = '-' if descending else ''
+        notices_qs = notices_qs.order_by(f'{prefix}{sort_by}', f'{prefix}id')
+        
+        # Pagination
+        start_index = (page - 1) * page_size
+        end_index = start_index + page_size
+        paginated_notices = projection.values(notices_qs)[start_index:end_index]
     
-    notices_list = [
-        {
-            'id': notice.id,
-            'headline': notice.headline,
-            'overview': notice.overview,
-            'description': notice.description,
-            'organization': notice.organization,
-            'category': notice.category,
-            'publish_date': notice.publish_date,
-            'expiration_date': notice.expiration_date,
-        }
-        for notice in paginated_notices
-    ]
+    notices_list = projection.items(paginated_notices)
     
+    if 'cursor' in request.GET:
+        return JsonResponse({"notices": notices_list, "next_cursor": next_cursor})
     return JsonResponse({"notices": notices_list})
 
 
@@ -625,6 +527,7 @@ def notice_page(request, pk):
     return render(request, 'publisher/notice_page.html', context)
 
 
+@cache_response(Notice)
 def get_notices(request):
     """API for homepage notices"""
     # Important notices
@@ -687,6 +590,9 @@ def subscriber_list(request):
     paginator = Paginator(subscribers, 50)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    # Unsubscribing goes through the signed link's confirmation page
+    for subscriber in page_obj:
+        subscriber.unsubscribe_url = unsubscribe_url(subscriber.id)
     
     return render(request, 'subscriptions/subscriber_list.html', {
         'page_obj': page_obj,
@@ -696,19 +602,28 @@ def subscriber_list(request):
     })
 
 
-def unsubscribe_link(request, email):
-    """One-click unsubscribe link"""
-    try:
-        subscriber = Subscriber.objects.get(email=email)
-        subscriber.is_active = False
-        subscriber.save()
-        
-        return render(request, 'subscriptions/unsubscribe_success.html', {
-            'email': email,
-            'message': 'You have been unsubscribed successfully.'
-        })
-    except Subscriber.DoesNotExist:
-        return render(request, 'subscriptions/unsubscribe_success.html', {
-            'email': email,
-            'message': 'Email not found in our subscription list.'
-        })
\ No newline at end of file
+# ==================== EMAIL TRACKING ====================
+
+# Smallest transparent GIF
+TRACKING_PIXEL = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00'
+    b'!\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+def track_open(request, token):
+    """Tracking pixel: buffers an open for the signed delivery id, never touches the DB itself"""
+    delivery_id = read_tracking_token(token)
+    if delivery_id is not None:
+        engagement_buffer.add(delivery_id)
+    response = HttpResponse(TRACKING_PIXEL, content_type='image/gif')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def track_click(request, token, story_id):
+    """Buffer a click for the signed delivery id and redirect to the story"""
+    delivery_id = read_tracking_token(token)
+    if delivery_id is not None:
+        engagement_buffer.add(delivery_id, clicked=True)
+    return redirect('story_page', pk=story_id)
@@ -1,3 +1,88 @@
+from django.core import mail
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import Subscriber
+from publisher.models import TransactionalEmail
+from publisher.utils.token_utils import stay_subscribed_url, unsubscribe_url
+
+
+class StaySubscribedTests(TestCase):
+    """The re-engagement link only counts once the subscriber confirms it"""
+
+    def setUp(self):
+        self.subscriber = Subscriber.objects.create(email='reader@example.com', is_verified=True)
+        self.url = stay_subscribed_url(self.subscriber.id)
+
+    def test_get_changes_nothing(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.subscriber.refresh_from_db()
+        self.assertIsNone(self.subscriber.last_engaged_at)
+
+    def test_post_records_engagement(self):
+        self.client.post(self.url)
+        self.subscriber.refresh_from_db()
+        self.assertIsNotNone(self.subscriber.last_engaged_at)
+
+    def test_unsubscribed_stay_inactive(self):
+        Subscriber.objects.filter(pk=self.subscriber.pk).update(is_active=False)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.is_active)
+
+
+class UnsubscribeByEmailTests(TestCase):
+    """Typing an address on the unsubscribe page only emails it a signed link"""
+
+    def setUp(self):
+        self.subscriber = Subscriber.objects.create(email='reader@example.com', is_verified=True)
+
+    def test_sends_link_without_unsubscribing(self):
+        response = self.client.get(reverse('unsubscribe'), {'email': 'reader@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.is_active)
+        email = TransactionalEmail.objects.get(email='reader@example.com')
+        self.assertIn(unsubscribe_url(self.subscriber.id), email.body)
+
+    def test_same_reply_for_unknown_address(self):
+        known = self.client.get(reverse('unsubscribe'), {'email': 'reader@example.com'}).json()
+        unknown = self.client.get(reverse('unsubscribe'), {'email': 'other@example.com'}).json()
+        self.assertEqual(known['message'].replace('reader', 'other'), unknown['message'])
+        self.assertFalse(TransactionalEmail.objects.filter(email='other@example.com').exists())
+
+
+class OneClickUnsubscribeTests(TestCase):
+    """The signed link asks first on GET; a POST (the button or an RFC 8058 client) unsubscribes"""
+
+    def setUp(self):
+        self.subscriber = Subscriber.objects.create(email='reader@example.com', is_verified=True)
+        self.url = unsubscribe_url(self.subscriber.id)
+
+    def test_get_asks_first(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.is_active)
+
+    def test_one_click_post(self):
+        response = self.client.post(self.url, {'List-Unsubscribe': 'One-Click'})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/plain'))
+        self.subscriber.refresh_from_db()
+        self.assertFalse(self.subscriber.is_active)
+
+    def test_forged_token(self):
+        response = self.client.post(self.url[:-2] + 'xx/', {'List-Unsubscribe': 'One-Click'})
+        self.assertEqual(response.status_code, 400)
+        self.subscriber.refresh_from_db()
+        self.assertTrue(self.subscriber.is_active)
+
+
+class SubscribeTests(TestCase):
+    """Subscribing answers without waiting on SMTP: the verification email is queued"""
+
+    def test_verification_queued(self):
+        response = self.client.post(reverse('subscribe'), {'name': 'Reader', 'email': 'reader@example.com'})
+        self.assertEqual(response.json()['icon'], 'success')
+        self.assertEqual(len(mail.outbox), 0)
+        email = TransactionalEmail.objects.get(email='reader@example.com')
+        self.assertIn(Subscriber.objects.get(email='reader@example.com').verification_token, email.body)
@@ -11,11 +11,13 @@ urlpatterns = [
     path('verify/<str:token>/', views.verify_email, name='verify_email'),
     path('unsubscribe/', views.unsubscribe_page, name='unsubscribe_page'),
     path('unsubscribe/action/', views.unsubscribe, name='unsubscribe'),
+    path('unsubscribe/one-click/<str:token>/', views.one_click_unsubscribe, name='one_click_unsubscribe'),
+    path('still-subscribed/<str:token>/', views.stay_subscribed, name='stay_subscribed'),
+    path('preferences/<str:token>/', views.subscriber_preferences, name='subscriber_preferences'),
     
     # Subscriber management
     path('subscribers/', views.subscriber_list, name='subscriber_list'),
     path('subscribers/export/', views.export_subscribers, name='export_subscribers'),
-    path('unsubscribe/link/<str:email>/', views.unsubscribe_link, name='unsubscribe_link'),
     
     # API endpoints
     path('subscriber/details/', views.get_subscriber_details, name='get_subscriber_details'),
@@ -1,6 +1,7 @@
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.db import transaction
+from django.urls import reverse
 from django.http import JsonResponse, HttpResponse
-from django.core.mail import send_mail, EmailMultiAlternatives
 from django.conf import settings
 import uuid
 import re
@@ -8,41 +9,21 @@ from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.db.models import Q
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 import csv
-import threading
 
 
 
 
 from accounts.models import Subscriber
-
-# Email sending in background thread
-class EmailThread(threading.Thread):
-    def __init__(self, subject, plain_message, html_message, recipient_list):
-        self.subject = subject
-        self.plain_message = plain_message
-        self.html_message = html_message
-        self.recipient_list = recipient_list
-        threading.Thread.__init__(self)
-
-    def run(self):
-        try:
-            email = EmailMultiAlternatives(
-                subject=self.subject,
-                body=self.plain_message,
-                from_email="NGO News Digest <{settings.DEFAULT_FROM_EMAIL}>",
-                to=self.recipient_list,
-            )
-            if self.html_message:
-                email.attach_alternative(self.html_message, "text/html")
-            email.send()
-        except Exception as e:
-            print(f"Error sending email: {e}")
-
-
-def send_email_in_background(subject, plain_message, html_message, recipient_list):
-    """Send email in background thread"""
-    EmailThread(subject, plain_message, html_message, recipient_list).start()
+from publisher.models import Category, SubscriberCategory
+from publisher.utils.engagement_utils import keep_subscribed
+from publisher.utils.outbox_utils import queue_mail
+from publisher.utils.suppression_utils import unsuppress
+from publisher.utils.token_utils import (
+    read_preferences_token, read_reengagement_token, read_unsubscribe_token, unsubscribe_url,
+)
 
 
 def subscribe_page(request):
@@ -74,6 +55,9 @@ def subscriber_list(request):
     paginator = Paginator(subscribers, 50)  # Show 50 per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    # Unsubscribing goes through the signed link's confirmation page
+    for subscriber in page_obj:
+        subscriber.unsubscribe_url = unsubscribe_url(subscriber.id)
     
     return render(request, 'subscriptions/subscriber_list.html', {
         'page_obj': page_obj,
@@ -106,22 +90,127 @@ def export_subscribers(request):
     return response
 
 
-def unsubscribe_link(request, email):
-    """One-click unsubscribe link"""
-    try:
-        subscriber = Subscriber.objects.get(email=email)
-        subscriber.is_active = False
-        subscriber.save()
-        
-        return render(request, 'subscriptions/unsubscribe_success.html', {
-            'email': email,
-            'message': 'You have been unsubscribed successfully.'
-        })
-    except Subscriber.DoesNotExist:
-        return render(request, 'subscriptions/unsubscribe_success.html', {
-            'email': email,
-            'message': 'Email not found in our subscription list.'
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def one_click_unsubscribe(request, token):
+    """
+    Unsubscribe via the signed link in every notification.
+
+    GET shows a confirmation button (link scanners must not unsubscribe
+    anyone); POST, from that button or from a mailbox provider's RFC 8058
+    one-click request, deactivates the subscriber with one UPDATE by
+    primary key. The token is checked by signature alone.
+    """
+    subscriber_id = read_unsubscribe_token(token)
+    if subscriber_id is None:
+        return render(request, 'subscriptions/unsubscribe_result.html', {
+            'success': False,
+            'title': 'Invalid Link',
+            'message': 'This unsubscribe link is not valid.',
+        }, status=400)
+    
+    if request.method == 'GET':
+        return render(request, 'subscriptions/unsubscribe_result.html', {'confirm': True})
+    
+    Subscriber.objects.filter(pk=subscriber_id).update(is_active=False)
+    
+    if request.POST.get('List-Unsubscribe') == 'One-Click':
+        return HttpResponse('Unsubscribed', content_type='text/plain')
+    return render(request, 'subscriptions/unsubscribe_result.html', {
+        'success': True,
+        'title': 'Unsubscribed',
+        'message': 'You will no longer receive emails from NGO News Digest.',
+    })
+
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def stay_subscribed(request, token):
+    """
+    "Keep me subscribed" link from a re-engagement email. GET shows a
+    confirmation button, as one_click_unsubscribe does, so link scanners
+    cannot count as engagement; POST records it.
+    """
+    subscriber_id = read_reengagement_token(token)
+    if subscriber_id is None:
+        return render(request, 'subscriptions/unsubscribe_result.html', {
+            'success': False,
+            'title': 'Invalid Link',
+            'message': 'This link is not valid.',
+        }, status=400)
+    
+    if request.method == 'GET':
+        return render(request, 'subscriptions/unsubscribe_result.html', {
+            'confirm': True,
+            'confirm_title': 'Keep receiving NGO News Digest?',
+            'confirm_message': 'Confirm and we will keep sending you story notifications and digests.',
+            'confirm_button': 'Keep Me Subscribed',
+            'confirm_icon': 'fa-user-check',
         })
+    
+    if not keep_subscribed(subscriber_id):
+        return render(request, 'subscriptions/unsubscribe_result.html', {
+            'success': False,
+            'title': 'Not Subscribed',
+            'message': 'This address is no longer subscribed. You can subscribe again from our homepage.',
+        }, status=400)
+    
+    return render(request, 'subscriptions/unsubscribe_result.html', {
+        'success': True,
+        'title': "You're Still Subscribed",
+        'message': 'Thanks for letting us know. You will keep receiving NGO News Digest.',
+    })
+
+def subscriber_preferences(request, token):
+    """
+    Let a subscriber pick story categories, vacancies/notices and delivery
+    mode, reached from the signed link in every email. Choosing no
+    categories (or all of them) means every story.
+    """
+    subscriber_id = read_preferences_token(token)
+    subscriber = Subscriber.objects.filter(pk=subscriber_id).first() if subscriber_id else None
+    if subscriber is None:
+        return render(request, 'subscriptions/unsubscribe_result.html', {
+            'success': False,
+            'title': 'Invalid Link',
+            'message': 'This preferences link is not valid.',
+        }, status=400)
+    
+    categories = list(Category.objects.order_by('name'))
+    
+    if request.method == 'POST':
+        delivery_mode = request.POST.get('delivery_mode', subscriber.delivery_mode)
+        if delivery_mode not in dict(Subscriber.DELIVERY_MODES):
+            delivery_mode = subscriber.delivery_mode
+        
+        valid_ids = {category.id for category in categories}
+        chosen = {int(i) for i in request.POST.getlist('categories') if i.isdigit()} & valid_ids
+        if chosen == valid_ids:
+            chosen = set()
+        
+        with transaction.atomic():
+            Subscriber.objects.filter(pk=subscriber.pk).update(
+                delivery_mode=delivery_mode,
+                receive_vacancies='receive_vacancies' in request.POST,
+                receive_notices='receive_notices' in request.POST,
+            )
+            SubscriberCategory.objects.filter(subscriber=subscriber).delete()
+            SubscriberCategory.objects.bulk_create([
+                SubscriberCategory(subscriber=subscriber, category_id=category_id)
+                for category_id in chosen
+            ])
+        
+        return redirect(reverse('subscriber_preferences', args=[token]) + '?saved=1')
+    
+    chosen = set(subscriber.category_preferences.values_list('category_id', flat=True))
+    return render(request, 'subscriptions/preferences.html', {
+        'subscriber': subscriber,
+        'categories': categories,
+        'chosen': chosen,
+        'delivery_modes': Subscriber.DELIVERY_MODES,
+        'saved': request.GET.get('saved') == '1',
+    })
 
 
 def subscribe(request):
@@ -130,6 +219,7 @@ def subscribe(request):
     
     name = request.POST.get('name', '').strip()
     email = request.POST.get('email', '').strip().lower()
+    delivery_mode = request.POST.get('delivery_mode', 'IMMEDIATE')
     
     # Validation
     if not name:
@@ -141,18 +231,23 @@ def subscribe(request):
     if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
         return JsonResponse({'custome_status': "Error", 'message': 'Invalid email format'})
     
+    if delivery_mode not in dict(Subscriber.DELIVERY_MODES):
+        return JsonResponse({'custome_status': "Error", 'message': 'Invalid delivery option'})
+    
     verification_token = str(uuid.uuid4())
     
     already_exist = Subscriber.objects.filter(email=email)
     if already_exist:
         subscriber = already_exist[0]
         subscriber.name = name
+        subscriber.delivery_mode = delivery_mode
         subscriber.verification_token = verification_token
         subscriber.save()
     else:
         new_subscriber = Subscriber()
         new_subscriber.email = email
         new_subscriber.name = name
+        new_subscriber.delivery_mode = delivery_mode
         new_subscriber.verification_token = verification_token
         new_subscriber.is_verified = False
         new_subscriber.is_active = False
@@ -162,10 +257,10 @@ def subscribe(request):
         f'/subscriptions/verify/{verification_token}/'
     )
     
-    try:
-        send_mail(
-            subject='Confirm Your Newsletter Subscription',
-            message=f"""Hello {name},
+    # Queued rather than sent here so a slow SMTP server never holds up the request
+    queue_mail(
+        subject='Confirm Your Newsletter Subscription',
+        message=f"""Hello {name},
 
 Thank you for subscribing to our newsletter!
 
@@ -174,16 +269,9 @@ Please click the link below to confirm:
 
 Best regards,
 Newsletter Team""",
-            from_email=f"NGO News Digest <{settings.DEFAULT_FROM_EMAIL}>",
-            recipient_list=[email],
-            fail_silently=True,  # ← This is what you want
-        )
-        # Optional: Log success silently (only you can see)
-        print(f"Subscription email sent to {email}")
-    except Exception as e:
-        # Log the error but don't tell the user
-        print(f"Email failed for {email}: {e}")
-        # Still return success to the user
+        from_email=f"NGO News Digest <{settings.DEFAULT_FROM_EMAIL}>",
+        recipient_list=[email],
+    )
     
     return JsonResponse({
         'title': "Success",
@@ -209,6 +297,8 @@ def verify_email(request, token):
         subscriber.is_active = True
         subscriber.verified_at = timezone.now()
         subscriber.save()
+        # Following the link proves the address receives mail again
+        unsuppress(subscriber.email)
         
         return render(request, 'subscriptions/verification_result.html', {
             'success': True,
@@ -233,27 +323,38 @@ def verify_email(request, token):
 
 def unsubscribe(request):
     """
-    Handle newsletter unsubscription
+    Email the address its signed unsubscribe link. Typing an address here
+    changes nothing by itself, so nobody can unsubscribe someone else, and
+    the reply is the same whether or not the address is subscribed.
     """
     email = request.GET.get('email', '').strip().lower()
     
     if not email:
         return JsonResponse({'custome_status': "Error", 'message': 'Email is required'})
     
-    already_exist = Subscriber.objects.filter(email=email)
-    if already_exist:
-        subscriber = already_exist[0]
-        subscriber.is_active = False
-        subscriber.save()
-        return JsonResponse({
-            'custome_status': "",
-            'message': f'Email {email} has been unsubscribed successfully!'
-        })
-    else:
-        return JsonResponse({
-            'custome_status': "",
-            'message': f'Email {email} was not found in our subscription list.'
-        })
+    subscriber = Subscriber.objects.filter(email=email, is_active=True).first()
+    if subscriber:
+        queue_mail(
+            subject='Confirm Your Unsubscription',
+            message=f"""Hello {subscriber.name or 'Reader'},
+
+We received a request to unsubscribe this address from our newsletter.
+
+Please click the link below to confirm:
+{unsubscribe_url(subscriber.id)}
+
+If you did not ask for this, you can ignore this email.
+
+Best regards,
+Newsletter Team""",
+            from_email=f"NGO News Digest <{settings.DEFAULT_FROM_EMAIL}>",
+            recipient_list=[email],
+        )
+    
+    return JsonResponse({
+        'custome_status': "",
+        'message': f'If {email} is subscribed, we have emailed it a link to confirm unsubscribing.'
+    })
 
 
 def get_subscriber_details(request):